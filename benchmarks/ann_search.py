@@ -0,0 +1,80 @@
+"""
+Measures the latency and recall@k of the plot index against exact search.
+By default, runs on synthetic clustered embeddings of the size of the corpus.
+Run from the benchmarks directory, optionally with the directory of a built index:
+
+    python ann_search.py [../data/plot_index]
+"""
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append("../src")
+
+import ann
+
+N = 42_000
+DIM = 384
+K = 20
+QUERIES = 200
+COUNTRIES = ["France", "India", "Japan", "United Kingdom", "United States of America"]
+GENRES = ["Drama", "Comedy", "Action", "Thriller", "Romance Film"]
+
+
+def synthetic_index(directory: str) -> ann.PlotIndex:
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(200, DIM))
+    embeddings = centers[rng.integers(len(centers), size=N)] + rng.normal(
+        scale=0.8, size=(N, DIM)
+    )
+    ids = np.arange(N)
+    attributes = pd.DataFrame(
+        {
+            "Wikipedia_Movie_ID": ids,
+            "Movie_Countries": rng.choice(COUNTRIES, size=N, p=[0.1, 0.15, 0.1, 0.15, 0.5]),
+            "decade": rng.choice(np.arange(1950, 2020, 10), size=N),
+            "year": 0,
+            "Movie_Name": "",
+        }
+    )
+    genres = pd.DataFrame(
+        {"Wikipedia_Movie_ID": ids, "Movie_Genres": rng.choice(GENRES, size=N)}
+    )
+    start = time.perf_counter()
+    index = ann.PlotIndex.build(embeddings.astype(np.float32), attributes, genres, directory=directory)
+    print(f"built index over {N:,} embeddings in {time.perf_counter() - start:.1f}s")
+    return index
+
+
+def benchmark(index: ann.PlotIndex, mask, label: str):
+    rng = np.random.default_rng(1)
+    queries = np.asarray(index.vectors[rng.integers(len(index.vectors), size=QUERIES)])
+    exact = []
+    start = time.perf_counter()
+    for q in queries:
+        exact.append(set(index.exact_search(q, K, mask)[0]))
+    exact_ms = (time.perf_counter() - start) / QUERIES * 1000
+    print(f"{label}: exact search {exact_ms:.2f} ms/query")
+    for nprobe in [1, 4, 8, 16, 32]:
+        start = time.perf_counter()
+        found = [set(index.search(q, K, nprobe, mask)[0]) for q in queries]
+        ms = (time.perf_counter() - start) / QUERIES * 1000
+        recall = np.mean([len(f & e) / max(len(e), 1) for f, e in zip(found, exact)])
+        print(f"{label}: nprobe={nprobe:>2} {ms:6.2f} ms/query, recall@{K} {recall:.3f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        index = ann.PlotIndex(sys.argv[1])
+    else:
+        index = synthetic_index(tempfile.mkdtemp())
+    benchmark(index, None, "all movies")
+    benchmark(index, index.mask(countries=["France"], genres=["Drama"]), "French dramas")
+    benchmark(
+        index,
+        index.mask(countries=["United States of America"], decades=[1990]),
+        "US 1990s",
+    )
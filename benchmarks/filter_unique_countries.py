@@ -0,0 +1,52 @@
+"""
+Compares the groupby/filter implementation of filter_unique_countries with the
+vectorized one on the full movie metadata.
+Run from the benchmarks directory, such that ../data points to the data folder:
+
+    python filter_unique_countries.py
+"""
+import sys
+import timeit
+
+sys.path.append("../src")
+
+import clean
+import load
+
+COUNTRIES = ["France", "India", "Japan", "United Kingdom", "United States of America"]
+REPEAT = 3
+
+
+def groupby_filter(df):
+    return df.groupby("Wikipedia_Movie_ID").filter(
+        lambda x: x.Movie_Countries.nunique() == 1
+    )
+
+
+def vectorized(df):
+    return df[clean.unique_country_mask(df)]
+
+
+def chained(df):
+    movies = clean.keep_countries(groupby_filter(df), COUNTRIES)
+    return movies, clean.movies_and_countries(movies)
+
+
+def fused(df):
+    return clean.unique_movies_and_countries(df, COUNTRIES)
+
+
+if __name__ == "__main__":
+    movies = load.movie_metadata()
+    print(f"{len(movies):,} rows, {movies.Wikipedia_Movie_ID.nunique():,} movies")
+
+    assert groupby_filter(movies).equals(vectorized(movies))
+    assert all(a.equals(b) for a, b in zip(chained(movies), fused(movies)))
+
+    for baseline, candidate in [(groupby_filter, vectorized), (chained, fused)]:
+        base = min(timeit.repeat(lambda: baseline(movies), number=1, repeat=REPEAT))
+        cand = min(timeit.repeat(lambda: candidate(movies), number=1, repeat=REPEAT))
+        print(
+            f"{baseline.__name__:>15}: {base:8.3f}s | {candidate.__name__:>10}: "
+            f"{cand:8.3f}s | speedup {base / cand:6.1f}x"
+        )
@@ -0,0 +1,69 @@
+"""
+Measures the time to import the data modules of the package in a fresh interpreter,
+and checks that they do not import the NLP or plotting dependencies.
+Exits with status 1 if the import takes longer than the target or pulls in a heavy
+dependency. Run from the benchmarks directory:
+
+    python import_time.py [--target 1.0] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules imported by data-only jobs
+DATA_MODULES = ["src.load", "src.clean", "src.aggregate", "src.pipeline"]
+# Dependencies that data-only jobs must not import
+HEAVY = [
+    "sentence_transformers",
+    "transformers",
+    "torch",
+    "sklearn",
+    "fast_pagerank",
+    "matplotlib",
+    "seaborn",
+]
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+for module in {modules!r}:
+    __import__(module)
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def import_time(modules, repeat: int):
+    """
+    Returns the best import time of the modules over repeat fresh interpreters, and
+    the heavy dependencies they imported.
+    """
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", SCRIPT.format(modules=modules, heavy=HEAVY)],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        runs.append(json.loads(output))
+    return min(r["seconds"] for r in runs), runs[0]["heavy"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--target", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    seconds, heavy = import_time(DATA_MODULES, args.repeat)
+    print(f"{', '.join(DATA_MODULES)}: {seconds:.3f}s (target {args.target:.3f}s)")
+    if heavy:
+        print(f"ERROR: heavy dependencies imported: {', '.join(heavy)}")
+    if seconds > args.target:
+        print("ERROR: import time above target")
+    sys.exit(1 if heavy or seconds > args.target else 0)
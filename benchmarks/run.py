@@ -0,0 +1,238 @@
+"""
+Benchmarks the loading, cleaning, aggregation and NLP hot paths on synthetic corpora
+(see synthetic.py) at several scales, and writes the timings and peak memory to JSON.
+Scale 1 is the size of the CMU corpus; scale 100 needs tens of GB of memory.
+With a baseline JSON file from a previous run, exits with status 1 if a benchmark
+is slower, or allocates more memory, than the baseline by more than the threshold
+factors. Run from the benchmarks directory:
+
+    python run.py --scales 1 10 100 --output results.json
+    python run.py --scales 0.05 --baseline results.json --threshold 1.5 --memory-threshold 1.2
+"""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.append("../src")
+
+import aggregate
+import cache
+import clean
+import load
+import pipeline
+import synthetic
+
+# Number of movies whose summary sentences are ranked, per unit of scale
+PAGE_RANK_MOVIES = 800
+# Timings below this many seconds and peak memory below this many MB are not compared
+# to the baseline, as they are noisy
+MIN_SECONDS = 0.01
+MIN_MB = 1.0
+
+
+def prepare(directory: str, scale: float) -> Dict:
+    """
+    Writes the synthetic corpus, points the loaders to it, and builds the inputs
+    of the benchmarks.
+    """
+    synthetic.write_corpus(directory, scale)
+    load.MOVIE_META_FILE = f"{directory}/MovieSummaries/movie.metadata.tsv"
+    load.CHARACTER_META_FILE = f"{directory}/MovieSummaries/character.metadata.tsv"
+    load.PLOT_SUM = f"{directory}/MovieSummaries/plot_summaries.txt"
+    cache.CACHE_DIR = f"{directory}/cache"
+
+    datasets = pipeline.datasets(verbose=False).run("D1", "D3")
+    summaries = load.plot_summaries()
+    return {
+        "movies_raw": pd.read_csv(load.MOVIE_META_FILE, sep="\t", names=load.MOVIE_META_COLS),
+        "movies": load.movie_metadata(),
+        "characters": load.character_metadata(),
+        "D3": datasets["D3"],
+        "sentences": [
+            summary.split(". ")
+            for summary in summaries.Summary.head(int(PAGE_RANK_MOVIES * scale))
+        ],
+    }
+
+
+def calc_age_inputs(data: Dict):
+    characters = data["characters"].copy()
+    with_dates = load.release_birth_date(characters)
+    characters, removed = clean.date_range(with_dates, characters)
+    # As in the notebook, the dates are parsed before computing the ages, such that
+    # the invalid dates of birth (dropped by calc_age) are missing
+    with_dates = with_dates.assign(
+        Actor_DOB=pd.to_datetime(with_dates.Actor_DOB, errors="coerce"),
+        Movie_Release_Date=pd.to_datetime(with_dates.Movie_Release_Date, errors="coerce"),
+    )
+    return with_dates, characters, removed
+
+
+def page_rank(sentences: List[List[str]]):
+    import nlp_modules
+
+    encoder = synthetic.HashEncoder()
+    return [nlp_modules.apply_page_rank(s, encoder, min_len=3) for s in sentences]
+
+
+# Benchmarks: name -> (setup returning the arguments, not timed; timed function)
+BENCHMARKS: Dict[str, Tuple[Callable[[Dict], tuple], Callable]] = {
+    "load.movie_metadata": (
+        lambda data: cache.clear("movies_raw") or (),
+        load.movie_metadata,
+    ),
+    "load.movie_metadata[cached]": (lambda data: (), load.movie_metadata),
+    "clean.explode_dict": (
+        lambda data: (data["movies_raw"], "Movie_Genres"),
+        clean.explode_dict,
+    ),
+    "clean.filter_unique_countries": (
+        lambda data: cache.clear("movies_unique") or (data["movies"],),
+        clean.filter_unique_countries,
+    ),
+    "clean.calc_age": (calc_age_inputs, clean.calc_age),
+    "clean.impute_ages": (lambda data: (data["characters"].copy(),), clean.impute_ages),
+    "aggregate.stats_age_by_country": (
+        lambda data: (data["D3"],),
+        aggregate.stats_age_by_country,
+    ),
+    "aggregate.ethnicities_country": (
+        lambda data: (data["D3"],),
+        aggregate.ethnicities_country,
+    ),
+    "aggregate.max_min": (lambda data: (data["D3"],), aggregate.max_min),
+    "aggregate.group_metrics": (
+        lambda data: (
+            data["D3"],
+            [
+                ("count", "Freebase_Actor_ID"),
+                ("nunique", "Actor_Ethnicity"),
+                ("describe", "Actor_Age_at_Movie_Release"),
+                ("describe", "Actor_Height"),
+            ],
+        ),
+        aggregate.group_metrics,
+    ),
+    "nlp_modules.apply_page_rank": (lambda data: (data["sentences"],), page_rank),
+}
+
+
+def measure(name: str, data: Dict, repeat: int) -> Dict:
+    """
+    Returns the best time over repeat runs, and the peak memory allocated by Python
+    during an additional run.
+    """
+    setup, func = BENCHMARKS[name]
+    times = []
+    for _ in range(repeat):
+        args = setup(data)
+        start = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - start)
+    args = setup(data)
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rows = len(result) if hasattr(result, "__len__") else None
+    return {"seconds": min(times), "peak_mb": peak / 2**20, "rows": rows}
+
+
+def regressions(
+    results: List[Dict], baseline: List[Dict], threshold: float, memory_threshold: float
+) -> List[str]:
+    """
+    Returns the benchmarks slower than the baseline by more than the threshold factor,
+    or whose peak memory is larger by more than the memory threshold factor.
+    """
+    previous = {(r["name"], r["scale"]): r for r in baseline if "seconds" in r}
+    worse = []
+    for result in results:
+        base = previous.get((result["name"], result["scale"]))
+        if base is None or "seconds" not in result:
+            continue
+        for key, unit, limit, floor in [
+            ("seconds", "s", threshold, MIN_SECONDS),
+            ("peak_mb", " MB", memory_threshold, MIN_MB),
+        ]:
+            if max(result[key], base[key]) < floor:
+                continue
+            ratio = result[key] / max(base[key], 1e-9)
+            if ratio > limit:
+                worse.append(
+                    f"{result['name']} (scale {result['scale']:g}): {base[key]:.3f}{unit} -> "
+                    f"{result[key]:.3f}{unit} ({ratio:.2f}x)"
+                )
+    return worse
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument("--output", default="results.json")
+    parser.add_argument("--baseline")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    parser.add_argument("--memory-threshold", type=float, default=1.25)
+    args = parser.parse_args()
+
+    results, failed = [], False
+    for scale in args.scales:
+        with tempfile.TemporaryDirectory() as directory:
+            data = prepare(directory, scale)
+            print(
+                f"scale {scale:g}: {len(data['movies_raw']):,} movies, "
+                f"{len(data['characters']):,} characters"
+            )
+            for name in args.only:
+                result = {"name": name, "scale": scale}
+                try:
+                    result.update(measure(name, data, args.repeat))
+                    print(
+                        f"  {name:<32} {result['seconds']:9.4f}s {result['peak_mb']:9.1f} MB"
+                    )
+                except ImportError as e:
+                    result["skipped"] = str(e)
+                    print(f"  {name:<32} skipped: {e}")
+                except Exception as e:
+                    result["error"] = repr(e)
+                    failed = True
+                    print(f"  {name:<32} ERROR: {e!r}")
+                results.append(result)
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "python": platform.python_version(),
+                "pandas": pd.__version__,
+                "numpy": np.__version__,
+                "platform": platform.platform(),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            worse = regressions(
+                results, json.load(f)["results"], args.threshold, args.memory_threshold
+            )
+        for line in worse:
+            print(f"REGRESSION: {line}")
+        failed = failed or bool(worse)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
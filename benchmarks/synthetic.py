@@ -0,0 +1,210 @@
+"""
+Synthetic corpus mimicking the CMU Movie Summary Corpus files, for benchmarks.
+At scale 1, the corpus has the size of the real corpus: 81,741 movies, 450,669
+characters and 42,306 plot summaries. Fractional scales give smaller corpora, e.g.
+0.05 for quick runs. The values follow the schemas of
+load.MOVIE_META_COLS and load.CHARACTER_META_COLS, with missing values, partial
+dates, invalid dates and outliers in similar proportions.
+
+    python synthetic.py DIRECTORY [SCALE]
+"""
+import json
+import os
+import sys
+import zlib
+
+import numpy as np
+import pandas as pd
+
+sys.path.append("../src")
+
+import load
+
+# Sizes of the CMU Movie Summary Corpus
+MOVIES = 81_741
+CHARACTERS_PER_MOVIE = 450_669 / MOVIES
+SUMMARY_FRACTION = 42_306 / MOVIES
+# Number of distinct {freebase_id:value} dictionaries of each column
+DICT_POOL = 500
+# Number of distinct ethnicities, and fraction of them with a label in query.json
+ETHNICITIES = 400
+RESOLVED_ETHNICITIES = 0.9
+
+LANGUAGES = ["English", "Hindi", "French", "Japanese", "Spanish", "German", "Italian",
+             "Tamil", "Telugu", "Mandarin", "Korean", "Russian"]
+COUNTRIES = ["United States of America", "India", "United Kingdom", "France", "Japan",
+             "Italy", "Canada", "Germany", "Spain", "Hong Kong", "Australia", "South Korea"]
+GENRES = ["Drama", "Comedy", "Romance Film", "Thriller", "Action", "World cinema",
+          "Crime Fiction", "Horror", "Black-and-white", "Indie", "Action/Adventure",
+          "Family Film", "Short Film", "Documentary", "Musical", "Science Fiction",
+          "Animation", "Mystery", "Western", "War film"]
+WORDS = ("the a his her their young old man woman family police city war love secret "
+         "finds kills meets returns escapes discovers village father mother son daughter "
+         "friend gang money murder school journey town king army doctor night").split()
+
+
+def _freebase_ids(prefix: str, n: int) -> np.ndarray:
+    return np.array([f"/m/0{prefix}{i:x}" for i in range(n)], dtype=object)
+
+
+def _zipf(rng: np.random.Generator, n: int, size: int, a: float = 1.1) -> np.ndarray:
+    """
+    Skewed choice of size values among n, the first values being the most frequent.
+    """
+    p = 1 / np.arange(1, n + 1) ** a
+    return rng.choice(n, size=size, p=p / p.sum())
+
+
+def _dict_pool(rng: np.random.Generator, labels, max_values: int, prefix: str) -> np.ndarray:
+    """
+    Distinct {freebase_id:value} JSON strings, with the most frequent labels first.
+    """
+    ids = _freebase_ids(prefix, len(labels))
+    pool = []
+    for _ in range(DICT_POOL):
+        n = rng.integers(1, max_values + 1)
+        chosen = np.unique(_zipf(rng, len(labels), n))
+        pool.append(json.dumps({ids[i]: labels[i] for i in chosen}))
+    return np.array(["{}"] + pool, dtype=object)
+
+
+def _dates(rng: np.random.Generator, years: np.ndarray, missing: float) -> np.ndarray:
+    """
+    Dates of the given years, as full dates, year-month or years only, or missing.
+    """
+    n = len(years)
+    months = rng.integers(1, 13, size=n)
+    days = rng.integers(1, 29, size=n)
+    full = pd.Series(years).astype(str) + "-" + pd.Series(months).map("{:02d}".format)
+    kind = rng.random(n)
+    dates = np.where(kind < 0.6, full + "-" + pd.Series(days).map("{:02d}".format), "")
+    dates = np.where((kind >= 0.6) & (kind < 0.65), full, dates)
+    dates = np.where(kind >= 0.65, pd.Series(years).astype(str), dates)
+    return np.where(rng.random(n) < missing, None, dates).astype(object)
+
+
+def movies(rng: np.random.Generator, n: int) -> pd.DataFrame:
+    years = rng.integers(1910, 2017, size=n)
+    revenue = rng.lognormal(16, 2, size=n).round()
+    runtime = rng.lognormal(np.log(95), 0.3, size=n).round(1)
+    pools = {
+        "Movie_Languages": _dict_pool(rng, [f"{l} Language" for l in LANGUAGES], 3, "l"),
+        "Movie_Countries": _dict_pool(rng, COUNTRIES, 2, "c"),
+        "Movie_Genres": _dict_pool(rng, GENRES, 6, "g"),
+    }
+    df = pd.DataFrame(
+        {
+            "Wikipedia_Movie_ID": rng.permutation(np.arange(n) * 7 + 330),
+            "Freebase_Movie_ID": _freebase_ids("m", n),
+            "Movie_Name": [f"Movie {i}" for i in range(n)],
+            "Movie_Release_Date": _dates(rng, years, missing=0.08),
+            "Revenue": np.where(rng.random(n) < 0.1, revenue, np.nan),
+            "Movie_Runtime": np.where(rng.random(n) < 0.75, runtime, np.nan),
+        }
+    )
+    for column, pool in pools.items():
+        # About 10% of the movies have an empty dictionary
+        df[column] = pool[np.where(rng.random(n) < 0.1, 0, 1 + _zipf(rng, DICT_POOL, n))]
+    df["_year"] = years
+    return df[load.MOVIE_META_COLS + ["_year"]]
+
+
+def characters(rng: np.random.Generator, movie_df: pd.DataFrame, n: int) -> pd.DataFrame:
+    movie = rng.integers(len(movie_df), size=n)
+    ages = rng.normal(38, 13, size=n).round()
+    release_years = movie_df._year.to_numpy()[movie]
+    dob = _dates(rng, release_years - ages.astype(int), missing=0.25)
+    # A few dates of birth that cannot be parsed
+    dob = np.where(rng.random(n) < 0.001, "1970-13-45", dob).astype(object)
+    heights = rng.normal(1.75, 0.1, size=n).round(3)
+    heights = np.where(rng.random(n) < 0.001, 510.0, heights)
+    ethnicities = _freebase_ids("e", ETHNICITIES)
+    actors = _zipf(rng, max(n // 3, 1), n, a=0.8)
+    return pd.DataFrame(
+        {
+            "Wikipedia_Movie_ID": movie_df.Wikipedia_Movie_ID.to_numpy()[movie],
+            "Freebase_Movie_ID": movie_df.Freebase_Movie_ID.to_numpy()[movie],
+            "Movie_Release_Date": movie_df.Movie_Release_Date.to_numpy()[movie],
+            "Character_Name": np.where(rng.random(n) < 0.43, None, [f"Character {i}" for i in range(n)]),
+            "Actor_DOB": dob,
+            "Actor_Gender": rng.choice(np.array(["M", "F", None], dtype=object), size=n, p=[0.65, 0.25, 0.1]),
+            "Actor_Height": np.where(rng.random(n) < 0.35, heights, np.nan),
+            "Actor_Ethnicity": np.where(
+                rng.random(n) < 0.24, ethnicities[_zipf(rng, ETHNICITIES, n)], None
+            ),
+            "Actor_Name": [f"Actor {a}" for a in actors],
+            "Actor_Age_at_Movie_Release": np.where(rng.random(n) < 0.65, ages, np.nan),
+            "Freebase_Char_Actor_Map_ID": _freebase_ids("ca", n),
+            "Freebase_Char_ID": np.where(rng.random(n) < 0.43, None, _freebase_ids("ch", n)),
+            "Freebase_Actor_ID": np.array([f"/m/0a{a:x}" for a in actors], dtype=object),
+        }
+    )[load.CHARACTER_META_COLS]
+
+
+def summaries(rng: np.random.Generator, movie_df: pd.DataFrame) -> pd.DataFrame:
+    ids = movie_df.Wikipedia_Movie_ID.to_numpy()
+    ids = ids[rng.random(len(ids)) < SUMMARY_FRACTION]
+    words = np.array(WORDS, dtype=object)
+    texts = []
+    for _ in range(len(ids)):
+        lengths = rng.integers(4, 30, size=rng.integers(2, 15))
+        texts.append(
+            " ".join(
+                " ".join(words[rng.integers(len(words), size=k)]).capitalize() + "."
+                for k in lengths
+            )
+        )
+    return pd.DataFrame({"Wikipedia_Movie_ID": ids, "Summary": texts})
+
+
+def write_corpus(directory: str, scale: float = 1, seed: int = 0):
+    """
+    Writes the movie metadata, character metadata and plot summary files in
+    directory/MovieSummaries, and the ethnicity labels in directory/query.json.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(f"{directory}/MovieSummaries", exist_ok=True)
+    movie_df = movies(rng, int(MOVIES * scale))
+    character_df = characters(rng, movie_df, round(MOVIES * CHARACTERS_PER_MOVIE * scale))
+    summary_df = summaries(rng, movie_df)
+
+    options = dict(sep="\t", header=False, index=False)
+    movie_df[load.MOVIE_META_COLS].to_csv(f"{directory}/MovieSummaries/movie.metadata.tsv", **options)
+    character_df.to_csv(f"{directory}/MovieSummaries/character.metadata.tsv", **options)
+    summary_df.to_csv(f"{directory}/MovieSummaries/plot_summaries.txt", **options)
+    ethnicities = _freebase_ids("e", int(ETHNICITIES * RESOLVED_ETHNICITIES))
+    with open(f"{directory}/query.json", "w") as f:
+        json.dump(
+            [{"freebaseID": e, "itemLabel": f"Ethnic group {i}"} for i, e in enumerate(ethnicities)],
+            f,
+        )
+
+
+class HashEncoder:
+    """
+    Small deterministic stand-in for a sentence transformer: each sentence is the
+    normalized sum of pseudo-random vectors of its words, seeded by the word.
+    Similar sentences get similar embeddings, without loading a model.
+    """
+
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+        self._words = {}
+
+    def _word(self, word: str) -> np.ndarray:
+        if word not in self._words:
+            rng = np.random.default_rng(zlib.crc32(word.encode()))
+            self._words[word] = rng.normal(size=self.dim).astype(np.float32)
+        return self._words[word]
+
+    def encode(self, sentences, **kwargs) -> np.ndarray:
+        embeddings = np.zeros((len(sentences), self.dim), dtype=np.float32)
+        for i, sentence in enumerate(sentences):
+            for word in sentence.lower().split():
+                embeddings[i] += self._word(word)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.where(norms == 0, 1, norms)
+
+
+if __name__ == "__main__":
+    write_corpus(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else 1)
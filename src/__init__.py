@@ -0,0 +1,38 @@
+"""
+Analysis of the CMU Movie Summary Corpus.
+Submodules are imported on first access (e.g. src.load), such that jobs that only
+load and clean the data do not import the NLP and plotting dependencies.
+"""
+import importlib
+
+SUBMODULES = [
+    "aggregate",
+    "ann",
+    "bow",
+    "cache",
+    "clean",
+    "clustering",
+    "contrast",
+    "cube",
+    "embeddings",
+    "features",
+    "instrument",
+    "join",
+    "keypoints",
+    "load",
+    "nlp_modules",
+    "pipeline",
+    "plot",
+    "resolve",
+    "stats",
+]
+
+
+def __getattr__(name):
+    if name not in SUBMODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return importlib.import_module(f".{name}", __name__)
+
+
+def __dir__():
+    return sorted(list(globals()) + SUBMODULES)
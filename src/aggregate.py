@@ -1,5 +1,6 @@
+import numpy as np
 import pandas as pd
-from typing import Tuple, List
+from typing import Tuple, List, Sequence
 
 
 def nmovies(df: pd.DataFrame) -> int:
@@ -46,7 +47,7 @@ def top_countries_nmovies(df: pd.DataFrame, n=10) -> pd.Series:
     """
     return (
         df[["Wikipedia_Movie_ID", "Movie_Countries"]]
-        .groupby("Movie_Countries")
+        .groupby("Movie_Countries", observed=True)
         .nunique()
         .sort_values("Wikipedia_Movie_ID", ascending=False)
         .head(n)
@@ -57,32 +58,204 @@ def stats_age_by_country(df: pd.DataFrame) -> pd.DataFrame:
     """
     Get statistics of actors' ages grouped by countries.
     """
-    return df.groupby('Movie_Countries')['Actor_Age_at_Movie_Release'].describe()
+    return df.groupby('Movie_Countries', observed=True)['Actor_Age_at_Movie_Release'].describe()
 
 
 def not_assigned_fb_ids(df: pd.DataFrame) -> List[str]:
     """
     Returns the not assigned Freebase IDs.
     """
-    not_found_ethn = []
-    for ethn in df.Actor_Ethnicity.unique():
-        if '/' in ethn:
-            not_found_ethn.append(ethn)
-
-    return not_found_ethn
+    ethnicities = df.Actor_Ethnicity
+    if isinstance(ethnicities.dtype, pd.CategoricalDtype):
+        # Only the categories in use need to be checked
+        ethnicities = ethnicities.cat.remove_unused_categories().cat.categories
+    ethnicities = pd.Series(ethnicities.dropna().unique(), dtype=object)
+    return list(ethnicities[ethnicities.str.contains("/", regex=False)])
 
 
 def ethnicities_country(df: pd.DataFrame) -> pd.DataFrame:
     """
     Returns the number of different ethnicities grouped by countries.
     """
-    return df.groupby(['Movie_Countries', 'decade']).Actor_Ethnicity.nunique()
+    return df.groupby(['Movie_Countries', 'decade'], observed=True).Actor_Ethnicity.nunique()
 
 
 def max_min(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """
     Returns the minimum and maximum values grouped by country and decade.
     """
-    min_v = df.groupby(['Movie_Countries', 'decade']).min(numeric_only=True)
-    max_v = df.groupby(['Movie_Countries', 'decade']).max(numeric_only=True)
+    min_v = df.groupby(['Movie_Countries', 'decade'], observed=True).min(numeric_only=True)
+    max_v = df.groupby(['Movie_Countries', 'decade'], observed=True).max(numeric_only=True)
     return min_v, max_v
+
+
+# Statistics returned by the describe metric, as in DataFrame.describe
+DESCRIBE_STATS = ["count", "mean", "std", "min", "25%", "50%", "75%", "max"]
+
+
+def group_codes(df: pd.DataFrame, by: List[str]) -> Tuple[np.ndarray, pd.DataFrame]:
+    """
+    Factorizes the given key columns into one group code per row.
+    Returns the codes and a DataFrame with the keys of each group, sorted by keys.
+    Rows with a missing key get code -1, as they are dropped by groupby.
+    """
+    codes = np.zeros(len(df), dtype=np.int64)
+    valid = np.ones(len(df), dtype=bool)
+    levels = []
+    for column in by:
+        column_codes, uniques = pd.factorize(df[column], sort=True)
+        codes = codes * max(len(uniques), 1) + column_codes
+        valid &= column_codes >= 0
+        levels.append(uniques)
+    groups, codes[valid] = np.unique(codes[valid], return_inverse=True)
+    codes[~valid] = -1
+    # Decode the combined codes back into the key of each group
+    keys = {}
+    for column, uniques in zip(reversed(by), reversed(levels)):
+        keys[column] = uniques.take(groups % max(len(uniques), 1))
+        groups = groups // max(len(uniques), 1)
+    return codes, pd.DataFrame({column: keys[column] for column in by})
+
+
+def _quantiles(values: np.ndarray, starts: np.ndarray, counts: np.ndarray, q: float):
+    """
+    Linearly interpolated quantile of each group of values sorted within groups.
+    """
+    position = q * np.maximum(counts - 1, 0)
+    lo = np.floor(position).astype(np.int64)
+    hi = np.ceil(position).astype(np.int64)
+    result = np.full(len(counts), np.nan)
+    nonempty = counts > 0
+    low = values[(starts + lo)[nonempty]]
+    high = values[(starts + hi)[nonempty]]
+    result[nonempty] = low + (high - low) * (position - lo)[nonempty]
+    return result
+
+
+def _value_counts(codes: np.ndarray, column: pd.Series, ngroups: int):
+    """
+    Counts the occurrences of each distinct value within each group.
+    Returns the group, the value code and the count of each (group, value) pair,
+    along with the distinct values.
+    """
+    value_codes, uniques = pd.factorize(column)
+    valid = (codes >= 0) & (value_codes >= 0)
+    nvalues = max(len(uniques), 1)
+    pairs, counts = np.unique(
+        codes[valid] * nvalues + value_codes[valid], return_counts=True
+    )
+    return pairs // nvalues, pairs % nvalues, counts, uniques
+
+
+def group_metrics(
+    df: pd.DataFrame,
+    metrics: List[Tuple],
+    by: Sequence[str] = ("Movie_Countries", "decade"),
+) -> pd.DataFrame:
+    """
+    Computes several metrics grouped by the given columns in a single pass over
+    the factorized keys, instead of one groupby per metric.
+    Each metric is a tuple (metric, column, *arguments), where metric is one of:
+    - count, nunique, sum, mean, min, max: (metric, column)
+    - ratio: ("ratio", numerator, denominator), the ratio of the column sums
+    - top_n: ("top_n", column, n), the n most frequent values and their counts
+    - describe: ("describe", column), the statistics of DataFrame.describe
+    Returns a tidy DataFrame with the group keys, the metric, the column, the
+    statistic (the metric name, the value for top_n or the describe statistic),
+    and its value.
+    """
+    by = list(by)
+    codes, groups = group_codes(df, by)
+    ngroups = len(groups)
+    rows = []
+
+    def add(metric, column, stat, values, group=None):
+        keys = groups if group is None else groups.iloc[group].reset_index(drop=True)
+        rows.append(
+            keys.assign(metric=metric, column=column, stat=stat, value=values)
+        )
+
+    # Sort rows by group once, metrics on numeric columns then use reduceat
+    order = np.argsort(codes, kind="stable")
+    order = order[codes[order] >= 0]
+    sorted_codes = codes[order]
+    starts = np.searchsorted(sorted_codes, np.arange(ngroups))
+    sizes = np.bincount(sorted_codes, minlength=ngroups)
+
+    def sorted_values(column: str) -> np.ndarray:
+        return df[column].to_numpy(dtype=float, na_value=np.nan)[order]
+
+    def group_sum(values: np.ndarray) -> np.ndarray:
+        values = np.where(np.isnan(values), 0, values)
+        return np.bincount(sorted_codes, weights=values, minlength=ngroups)
+
+    def group_reduce(ufunc, values: np.ndarray) -> np.ndarray:
+        result = np.full(ngroups, np.nan)
+        nonempty = sizes > 0
+        result[nonempty] = ufunc.reduceat(values, starts[nonempty])
+        return result
+
+    for metric, column, *args in metrics:
+        if metric == "count":
+            valid = df[column].notna().to_numpy()[order]
+            add(metric, column, metric, np.bincount(sorted_codes[valid], minlength=ngroups))
+        elif metric == "nunique":
+            group, _, _, _ = _value_counts(codes, df[column], ngroups)
+            add(metric, column, metric, np.bincount(group, minlength=ngroups))
+        elif metric == "sum":
+            add(metric, column, metric, group_sum(sorted_values(column)))
+        elif metric == "mean":
+            values = sorted_values(column)
+            count = np.bincount(sorted_codes[~np.isnan(values)], minlength=ngroups)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                add(metric, column, metric, group_sum(values) / count)
+        elif metric in ("min", "max"):
+            ufunc = np.fmin if metric == "min" else np.fmax
+            add(metric, column, metric, group_reduce(ufunc, sorted_values(column)))
+        elif metric == "ratio":
+            denominator = args[0]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                ratio = group_sum(sorted_values(column)) / group_sum(
+                    sorted_values(denominator)
+                )
+            add(metric, f"{column}/{denominator}", metric, ratio)
+        elif metric == "top_n":
+            n = args[0]
+            group, value, count, uniques = _value_counts(codes, df[column], ngroups)
+            # Sort by group, then by decreasing count, and keep the first n
+            top = np.lexsort((-count, group))
+            group, value, count = group[top], value[top], count[top]
+            rank = np.arange(len(group)) - np.searchsorted(group, group)
+            keep = rank < n
+            add(metric, column, uniques.take(value[keep]), count[keep], group[keep])
+        elif metric == "describe":
+            values = sorted_values(column)
+            valid = ~np.isnan(values)
+            # Sort values within each group for the quantiles
+            within = np.lexsort((values[valid], sorted_codes[valid]))
+            group_values = values[valid][within]
+            count = np.bincount(sorted_codes[valid], minlength=ngroups)
+            value_starts = np.cumsum(count) - count
+            total = group_sum(values)
+            squares = group_sum(values**2)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = total / count
+                std = np.sqrt(np.maximum(squares - count * mean**2, 0) / (count - 1))
+            stats = {
+                "count": count,
+                "mean": mean,
+                "std": np.where(count > 1, std, np.nan),
+                "min": _quantiles(group_values, value_starts, count, 0),
+                "25%": _quantiles(group_values, value_starts, count, 0.25),
+                "50%": _quantiles(group_values, value_starts, count, 0.5),
+                "75%": _quantiles(group_values, value_starts, count, 0.75),
+                "max": _quantiles(group_values, value_starts, count, 1),
+            }
+            for stat in DESCRIBE_STATS:
+                add(metric, column, stat, stats[stat])
+        else:
+            raise ValueError(f"Unknown metric {metric}")
+
+    if not rows:
+        return pd.DataFrame(columns=list(by) + ["metric", "column", "stat", "value"])
+    return pd.concat(rows, ignore_index=True)
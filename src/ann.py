@@ -0,0 +1,210 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from typing import Optional, Sequence, Union
+if __package__:
+    from . import join, nlp_modules
+else:
+    import join
+    import nlp_modules
+
+# Directory of the plot embedding index, next to the raw data
+INDEX_DIR = "../data/plot_index"
+
+
+def plot_embeddings(summaries: pd.DataFrame, model, batch_size: int = 64) -> np.ndarray:
+    """
+    Encodes each plot summary into a single unit-norm float32 embedding.
+    """
+    return nlp_modules.normalize_rows(
+        model.encode(list(summaries.Summary), batch_size=batch_size)
+    )
+
+
+def plot_attributes(summaries: pd.DataFrame, movies: pd.DataFrame):
+    """
+    Returns the attributes used to filter queries: one row per summary with its movie
+    name, country, year and decade, and a link table with the genres of each movie.
+    The movies DataFrame is the D1 dataset (one country per movie, with year and decade).
+    """
+    ids = summaries[["Wikipedia_Movie_ID"]]
+    movies = join.MovieDimension(movies)
+    positions = movies.positions(ids.Wikipedia_Movie_ID)
+    attributes = movies.align(
+        ids, ["year", "decade", "Movie_Countries", "Movie_Name"], how="left", positions=positions
+    )
+    genres = movies.align(ids, ["Movie_Genres"], positions=positions).drop_duplicates()
+    return attributes, genres
+
+
+class PlotIndex:
+    """
+    Inverted file (IVF) index over unit-norm plot embeddings, stored memory-mapped on disk.
+    The embeddings are clustered with mini-batch k-means, and stored sorted by cluster,
+    such that a query only scans the clusters whose centroids are closest to it.
+    Each row is associated with the attributes of its movie, used to filter queries.
+    """
+
+    def __init__(self, directory: str = INDEX_DIR):
+        self.directory = directory
+        with open(f"{directory}/meta.json") as f:
+            meta = json.load(f)
+        self.vectors = np.memmap(
+            f"{directory}/vectors.f32",
+            dtype=np.float32,
+            mode="r",
+            shape=(meta["n"], meta["dim"]),
+        )
+        self.centroids = np.load(f"{directory}/centroids.npy")
+        self.offsets = np.load(f"{directory}/offsets.npy")
+        self.attributes = pd.read_parquet(f"{directory}/attributes.parquet")
+        self.genres = pd.read_parquet(f"{directory}/genres.parquet")
+        self.rows = pd.Series(
+            np.arange(len(self.attributes)), index=self.attributes.Wikipedia_Movie_ID
+        )
+
+    @staticmethod
+    def build(
+        embeddings: np.ndarray,
+        attributes: pd.DataFrame,
+        genres: pd.DataFrame,
+        nlist: Optional[int] = None,
+        directory: str = INDEX_DIR,
+        block_size: int = 65536,
+    ) -> "PlotIndex":
+        """
+        Builds the index from the plot embeddings and the attributes of their movies,
+        as returned by plot_embeddings and plot_attributes, and writes it to disk.
+        By default, the number of clusters is about 4 sqrt(n).
+        """
+        from sklearn.cluster import MiniBatchKMeans
+
+        embeddings = nlp_modules.normalize_rows(embeddings)
+        n = len(embeddings)
+        nlist = nlist or max(int(4 * np.sqrt(n)), 1)
+        kmeans = MiniBatchKMeans(n_clusters=min(nlist, n), n_init=3, random_state=0)
+        kmeans.fit(embeddings)
+        centroids = nlp_modules.normalize_rows(kmeans.cluster_centers_)
+        # Assign each embedding to the centroid with the highest similarity
+        assignment = np.concatenate(
+            [
+                np.argmax(embeddings[i : i + block_size] @ centroids.T, axis=1)
+                for i in range(0, n, block_size)
+            ]
+        )
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.searchsorted(assignment[order], np.arange(len(centroids) + 1))
+
+        os.makedirs(directory, exist_ok=True)
+        embeddings[order].tofile(f"{directory}/vectors.f32")
+        np.save(f"{directory}/centroids.npy", centroids)
+        np.save(f"{directory}/offsets.npy", offsets)
+        attributes.iloc[order].reset_index(drop=True).to_parquet(
+            f"{directory}/attributes.parquet"
+        )
+        genres.to_parquet(f"{directory}/genres.parquet")
+        with open(f"{directory}/meta.json", "w") as f:
+            json.dump({"n": n, "dim": embeddings.shape[1]}, f)
+        return PlotIndex(directory)
+
+    def mask(
+        self,
+        countries: Optional[Sequence[str]] = None,
+        genres: Optional[Sequence[str]] = None,
+        decades: Optional[Sequence[int]] = None,
+    ) -> Optional[np.ndarray]:
+        """
+        Returns a boolean mask of the rows matching the given attributes, or None if
+        no attribute is given.
+        """
+        if countries is None and genres is None and decades is None:
+            return None
+        mask = np.ones(len(self.attributes), dtype=bool)
+        if countries is not None:
+            mask &= self.attributes.Movie_Countries.isin(countries).to_numpy()
+        if decades is not None:
+            mask &= self.attributes.decade.isin(decades).to_numpy(dtype=bool)
+        if genres is not None:
+            movies = self.genres.Wikipedia_Movie_ID[self.genres.Movie_Genres.isin(genres)]
+            mask &= self.attributes.Wikipedia_Movie_ID.isin(movies).to_numpy()
+        return mask
+
+    def vector(self, movie_id: int) -> np.ndarray:
+        """
+        Returns the embedding of the plot of the given movie.
+        """
+        return np.asarray(self.vectors[self.rows[movie_id]])
+
+    def exact_search(
+        self, query: np.ndarray, k: int = 10, mask: Optional[np.ndarray] = None
+    ):
+        """
+        Returns the rows and similarities of the k most similar embeddings, among
+        the rows of the mask if given, by brute force.
+        """
+        rows = np.arange(len(self.vectors)) if mask is None else np.flatnonzero(mask)
+        return self._top(rows, query, k)
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 10,
+        nprobe: int = 8,
+        mask: Optional[np.ndarray] = None,
+    ):
+        """
+        Returns the rows and similarities of the (approximately) k most similar
+        embeddings, among the rows of the mask if given. Only the nprobe clusters
+        closest to the query are scanned. With a mask, the number of scanned clusters
+        is scaled by the inverse of the fraction of selected rows, to scan about as many
+        candidates as without mask. If that is more than the selected rows, these are
+        searched exhaustively instead.
+        """
+        query = nlp_modules.normalize_rows(query.reshape(1, -1))[0]
+        if mask is not None:
+            selected = mask.sum()
+            nprobe = int(np.ceil(nprobe * len(mask) / max(selected, 1)))
+        lists = np.argsort(-(self.centroids @ query))[:nprobe]
+        sizes = self.offsets[lists + 1] - self.offsets[lists]
+        if mask is not None and selected <= sizes.sum():
+            return self.exact_search(query, k, mask)
+        rows = np.concatenate(
+            [np.arange(self.offsets[l], self.offsets[l + 1]) for l in lists]
+        )
+        if mask is not None:
+            rows = rows[mask[rows]]
+        return self._top(rows, query, k)
+
+    def _top(self, rows: np.ndarray, query: np.ndarray, k: int):
+        if len(rows) == len(self.vectors):
+            similarities = np.asarray(self.vectors @ query)[rows]
+        else:
+            similarities = self.vectors[rows] @ query
+        top = np.argsort(-similarities, kind="stable")[:k]
+        return rows[top], similarities[top]
+
+    def query(
+        self,
+        movie: Union[int, np.ndarray],
+        k: int = 20,
+        countries: Optional[Sequence[str]] = None,
+        genres: Optional[Sequence[str]] = None,
+        decades: Optional[Sequence[int]] = None,
+        nprobe: int = 8,
+    ) -> pd.DataFrame:
+        """
+        Returns the k movies whose plots are closest to the given movie (ID) or embedding,
+        among the movies with the given countries, genres and decades, e.g. the top 20
+        French dramas of the 1990s closest to a US drama.
+        """
+        mask = self.mask(countries, genres, decades)
+        if isinstance(movie, (int, np.integer)):
+            query = self.vector(movie)
+            # Exclude the movie itself
+            mask = np.ones(len(self.vectors), dtype=bool) if mask is None else mask.copy()
+            mask[self.rows[movie]] = False
+        else:
+            query = movie
+        rows, similarities = self.search(query, k, nprobe, mask)
+        return self.attributes.iloc[rows].assign(similarity=similarities)
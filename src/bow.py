@@ -0,0 +1,160 @@
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from typing import Dict, List, Optional
+
+# Directory of the bag-of-words matrix and vocabulary, next to the raw data
+BOW_DIR = "../data/bow"
+
+# Lower case words of at least two letters, possibly with inner apostrophes or hyphens
+TOKEN = re.compile(r"[a-z][a-z'\-]*[a-z]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits a plot summary into lower case word tokens.
+    """
+    return TOKEN.findall(text.lower())
+
+
+def stop_words() -> frozenset:
+    """
+    Returns the English stop words, which are left out of the vocabulary.
+    """
+    from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+    return ENGLISH_STOP_WORDS
+
+
+class BagOfWords:
+    """
+    Sparse document-term count matrix of the plot summaries, with a shared vocabulary.
+    Summaries are tokenized once; counts per group of summaries (country, genre, decade,
+    ...) are then a sparse product with a group indicator matrix instead of a re-count.
+    New summaries can be added incrementally, extending the vocabulary.
+    """
+
+    def __init__(self, remove_stop_words: bool = True):
+        self.vocabulary: Dict[str, int] = {}
+        self.terms: List[str] = []
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.counts = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self.stop_words = stop_words() if remove_stop_words else frozenset()
+
+    def add(self, summaries: pd.DataFrame) -> "BagOfWords":
+        """
+        Adds the given summaries (Wikipedia_Movie_ID and Summary columns) to the matrix.
+        Summaries whose movie ID is already in the matrix, or repeated in the given
+        summaries (e.g. aligned with several genres), are skipped.
+        """
+        ids = summaries.Wikipedia_Movie_ID
+        summaries = summaries[~ids.isin(self.ids) & ~ids.duplicated()]
+        indptr, indices = [0], []
+        for summary in summaries.Summary:
+            for token in tokenize(summary):
+                if token in self.stop_words:
+                    continue
+                index = self.vocabulary.setdefault(token, len(self.vocabulary))
+                if index == len(self.terms):
+                    self.terms.append(token)
+                indices.append(index)
+            indptr.append(len(indices))
+        # Repeated tokens give duplicate (document, term) entries, which are summed
+        new = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.int32), indices, indptr),
+            shape=(len(summaries), len(self.terms)),
+        )
+        new.sum_duplicates()
+        old = self.counts
+        old.resize((old.shape[0], len(self.terms)))
+        self.counts = sparse.vstack([old, new], format="csr")
+        self.ids = np.concatenate([self.ids, summaries.Wikipedia_Movie_ID.to_numpy()])
+        return self
+
+    def indicator(self, groups: pd.DataFrame, column: str):
+        """
+        Returns the sparse (groups x summaries) indicator matrix for a table associating
+        movie IDs with the given group column (e.g. movies_and_countries, or the movie
+        genre link table), and the label of each group. A summary may belong to
+        several groups.
+        """
+        positions = pd.Index(self.ids).get_indexer(groups.Wikipedia_Movie_ID)
+        codes, labels = pd.factorize(groups[column], sort=True)
+        valid = (positions >= 0) & (codes >= 0)
+        indicator = sparse.csr_matrix(
+            (np.ones(valid.sum(), dtype=np.int32), (codes[valid], positions[valid])),
+            shape=(len(labels), len(self.ids)),
+        )
+        indicator.sum_duplicates()
+        indicator.data[:] = 1
+        return indicator, labels
+
+    def group_counts(self, groups: pd.DataFrame, column: str) -> sparse.csr_matrix:
+        """
+        Returns the sparse (groups x terms) counts of each term per group, with the
+        groups in the order of labels returned by indicator.
+        """
+        indicator, _ = self.indicator(groups, column)
+        return indicator @ self.counts
+
+    def frame(
+        self, groups: pd.DataFrame, column: str, n: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        Returns the term counts per group as a long DataFrame (group, word, count),
+        sorted by decreasing count within each group, keeping the n most frequent words
+        if given, e.g. to draw the word clouds of each group.
+        """
+        indicator, labels = self.indicator(groups, column)
+        counts = (indicator @ self.counts).tocoo()
+        df = pd.DataFrame(
+            {
+                column: labels.take(counts.row),
+                "word": np.asarray(self.terms, dtype=object)[counts.col],
+                "count": counts.data,
+            }
+        ).sort_values([column, "count"], ascending=[True, False], kind="stable")
+        if n is not None:
+            df = df.groupby(column, sort=False).head(n)
+        return df.reset_index(drop=True)
+
+    def tfidf(self, counts: Optional[sparse.csr_matrix] = None) -> sparse.csr_matrix:
+        """
+        Returns the TF-IDF weights of the given (documents or groups x terms) counts,
+        by default the summaries, with the smoothed IDF of the summaries and unit-norm rows.
+        """
+        counts = self.counts if counts is None else counts
+        df = np.bincount(self.counts.indices, minlength=len(self.terms))
+        idf = np.log((1 + len(self.ids)) / (1 + df)) + 1
+        weights = sparse.csr_matrix(counts, dtype=np.float64) @ sparse.diags(idf)
+        norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+        return sparse.diags(1 / np.where(norms == 0, 1, norms)) @ weights
+
+    def save(self, directory: str = BOW_DIR):
+        """
+        Saves the matrix, the movie IDs and the vocabulary in uncompressed binary formats,
+        which are written and read without encoding.
+        """
+        os.makedirs(directory, exist_ok=True)
+        sparse.save_npz(f"{directory}/counts.npz", self.counts, compressed=False)
+        np.save(f"{directory}/ids.npy", self.ids)
+        np.save(f"{directory}/terms.npy", np.asarray(self.terms, dtype=str))
+        with open(f"{directory}/meta.json", "w") as f:
+            json.dump({"stop_words": bool(self.stop_words)}, f)
+
+    @staticmethod
+    def load(directory: str = BOW_DIR) -> "BagOfWords":
+        """
+        Loads a matrix saved with save.
+        """
+        with open(f"{directory}/meta.json") as f:
+            meta = json.load(f)
+        bow = BagOfWords(remove_stop_words=meta["stop_words"])
+        bow.terms = np.load(f"{directory}/terms.npy").tolist()
+        bow.vocabulary = {term: i for i, term in enumerate(bow.terms)}
+        bow.ids = np.load(f"{directory}/ids.npy")
+        bow.counts = sparse.load_npz(f"{directory}/counts.npz").tocsr()
+        return bow
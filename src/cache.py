@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import warnings
+import pandas as pd
+from glob import glob
+from typing import Callable, Dict, List, Optional, Sequence
+
+# Cache directory, next to the raw data
+CACHE_DIR = "../data/cache"
+# Default size of the cache on disk after prune, in megabytes
+MAX_SIZE_MB = 2000
+
+# Digests of source files, keyed on (path, size, mtime) so that unchanged
+# files are only hashed once per session
+_file_digests: Dict[tuple, str] = {}
+
+
+def file_fingerprint(path: str) -> Dict:
+    """
+    Returns the size, modification time and content hash of the given file.
+    The content hash is only recomputed when the size or modification time changed.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_digests:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _file_digests[memo_key] = digest.hexdigest()
+    return {
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "hash": _file_digests[memo_key],
+    }
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Returns a content hash of the given DataFrame (values, index and column names).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([str(c) for c in df.columns]).encode())
+    digest.update(json.dumps([str(t) for t in df.dtypes]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def cache_key(
+    sources: Sequence[str] = (), frames: Sequence[pd.DataFrame] = (), **params
+) -> str:
+    """
+    Builds the key of a cache entry from the fingerprints of its source files,
+    its input DataFrames and the parameters of the loader that produces it.
+    """
+    key = {
+        "sources": [file_fingerprint(path) for path in sources],
+        "frames": [frame_fingerprint(df) for df in frames],
+        "params": params,
+    }
+    encoded = json.dumps(key, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=12).hexdigest()
+
+
+def entry_path(name: str, key: str) -> str:
+    """
+    Returns the path of the Parquet file storing the cache entry.
+    """
+    return f"{CACHE_DIR}/{name}-{key}.parquet"
+
+
+def read(name: str, key: str, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+    """
+    Reads the given columns of a cache entry. Returns None if the entry does not
+    exist or cannot be read.
+    """
+    path = entry_path(name, key)
+    if not os.path.exists(path):
+        return None
+    try:
+        df = pd.read_parquet(path, columns=columns)
+    except (OSError, ValueError) as e:
+        # A warning rather than a print, which would mix into the output of the commands
+        warnings.warn(f"Could not read cache entry {path} ({e}), rebuilding it", stacklevel=2)
+        return None
+    # The modification time of an entry is the time it was last used, see prune
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return df
+
+
+def write(name: str, key: str, df: pd.DataFrame):
+    """
+    Writes a cache entry. Entries with other keys are kept, such that switching
+    between parameters reuses them, see prune to bound the size of the cache.
+    The file is written to a temporary path first, such that an interrupted
+    write never leaves a corrupted entry behind.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = entry_path(name, key)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    df.to_parquet(tmp, index=not isinstance(df.index, pd.RangeIndex))
+    os.replace(tmp, path)
+
+
+def cached(
+    name: str,
+    build: Callable[[], pd.DataFrame],
+    columns: Optional[List[str]] = None,
+    sources: Sequence[str] = (),
+    frames: Sequence[pd.DataFrame] = (),
+    **params,
+) -> pd.DataFrame:
+    """
+    Returns the DataFrame produced by build, reading it from the cache if an entry
+    exists for the same sources, input frames and parameters.
+    Only the requested columns are read from disk (all columns by default).
+    """
+    key = cache_key(sources, frames, **params)
+    df = read(name, key, columns)
+    if df is not None:
+        return df
+    df = build()
+    write(name, key, df)
+    return df if columns is None else df[columns]
+
+
+def clear(name: str = "*"):
+    """
+    Removes all cache entries with the given name (all entries by default).
+    """
+    for path in glob(entry_path(name, "*")):
+        os.remove(path)
+
+
+def prune(max_mb: float = MAX_SIZE_MB) -> List[str]:
+    """
+    Removes the least recently used cache entries until the cache takes at most
+    max_mb megabytes on disk, and returns the paths of the removed entries.
+    Entries that are being read by another process may be removed too, so this is
+    not run automatically.
+    """
+    entries = []
+    for path in glob(entry_path("*", "*")):
+        stat = os.stat(path)
+        entries.append((stat.st_mtime_ns, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    removed = []
+    for _, size, path in sorted(entries):
+        if total <= max_mb * 1e6:
+            break
+        os.remove(path)
+        total -= size
+        removed.append(path)
+    return removed
@@ -1,7 +1,34 @@
 from typing import Sequence
+import json
+import numpy as np
 import pandas as pd
-import datetime
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple, Union
+if __package__:
+    from . import cache, join, resolve
+else:
+    import cache
+    import join
+    import resolve
+
+# Columns of the movie metadata that contain {freebase_id:value} dictionaries
+DICT_COLUMNS = ["Movie_Languages", "Movie_Countries", "Movie_Genres"]
+# Float columns stored as float32 in compact mode. Revenues keep their precision.
+FLOAT32_COLUMNS = ["Movie_Runtime", "Actor_Height", "Actor_Age_at_Movie_Release"]
+
+
+def parse_freebase_dicts(values: pd.Series) -> Tuple[np.ndarray, List[List[str]]]:
+    """
+    Parses a column of {freebase_id:value} JSON strings.
+    Returns, for each row, the index of its dictionary in the returned list of
+    distinct parsed dictionary values. Each distinct string is only parsed once,
+    as the same combinations of languages, countries and genres are repeated
+    across many movies. Missing values are parsed as empty dictionaries.
+    """
+    codes, uniques = pd.factorize(values)
+    parsed = [list(json.loads(v).values()) for v in uniques]
+    # Missing values have code -1, which points to the trailing empty list
+    parsed.append([])
+    return codes, parsed
 
 
 def explode_dict(df: pd.DataFrame, column: str) -> pd.DataFrame:
@@ -10,28 +37,89 @@ def explode_dict(df: pd.DataFrame, column: str) -> pd.DataFrame:
     them, i.e. creates one new row for each value of that dictionary.
     """
     result = df.copy()
-    # Convert dictionary to iterable of values
-    result[column] = df[column].apply(eval).apply(dict.values)
-    # Explode on that iterable
+    # Convert dictionary to list of values
+    codes, parsed = parse_freebase_dicts(df[column])
+    lists = np.empty(len(parsed), dtype=object)
+    lists[:] = parsed
+    result[column] = lists[codes]
+    # Explode on that list
     return result.explode(column)
 
 
+def freebase_links(
+    df: pd.DataFrame, column: str, key: str = "Wikipedia_Movie_ID"
+) -> pd.DataFrame:
+    """
+    Takes a column with dictionary values of form {freebase_id:value} and returns a
+    link table with one row per (key, value) pair. The values are categorical.
+    Rows with empty dictionaries do not appear in the link table.
+    """
+    codes, parsed = parse_freebase_dicts(df[column])
+    # Encode all dictionary values with a single set of categories
+    flat_codes, categories = pd.factorize(
+        pd.Series([value for values in parsed for value in values], dtype=object)
+    )
+    lengths = np.array([len(values) for values in parsed])
+    starts = np.cumsum(lengths) - lengths
+    # Number of values and position of the first value for each row
+    counts = lengths[codes]
+    first = np.repeat(starts[codes], counts)
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return pd.DataFrame(
+        {
+            key: np.repeat(df[key].to_numpy(), counts),
+            column: pd.Categorical.from_codes(flat_codes[first + within], categories),
+        }
+    )
+
+
+def normalize_movies(
+    df: pd.DataFrame,
+) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Splits the raw movie metadata into a movie table with one row per movie and
+    link tables associating each movie with its languages, countries and genres.
+    This avoids the cross product of languages, countries and genres created by
+    exploding the three columns one after the other.
+    """
+    movies = df.drop(columns=DICT_COLUMNS)
+    languages, countries, genres = (freebase_links(df, column) for column in DICT_COLUMNS)
+    return movies, languages, countries, genres
+
+
+def unique_country_mask(df: pd.DataFrame) -> pd.Series:
+    """
+    Returns a boolean mask of the rows whose movie originates from a single country.
+    The number of countries of each movie is computed in a single vectorized pass.
+    """
+    countries = df.groupby("Wikipedia_Movie_ID", sort=False).Movie_Countries.transform(
+        "nunique"
+    )
+    return countries == 1
+
+
 def filter_unique_countries(df: pd.DataFrame) -> pd.DataFrame:
     """
     Drops all movies that originate from multiple countries.
-    It stores the result in a pickle for faster reuse, as this
-    method can take a bit of time.
+    It stores the result in the Parquet cache for faster reuse. The cache is
+    keyed on the content of the given DataFrame.
     """
-    pickle = "./df_movies_unique.pickle"
-    try:
-        return pd.read_pickle(pickle)
-    except:
-        # Return only movies that come from a single country
-        df = df.groupby("Wikipedia_Movie_ID").filter(
-            lambda x: x.Movie_Countries.nunique() == 1
-        )
-        pd.to_pickle(df, pickle)
-        return df
+    return cache.cached(
+        "movies_unique", lambda: df[unique_country_mask(df)], frames=[df]
+    )
+
+
+def unique_movies_and_countries(
+    df: pd.DataFrame, countries: Sequence[str]
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Fused version of filter_unique_countries, keep_countries and
+    movies_and_countries. Keeps the movies that originate from a single country
+    of the given list, and returns them along with the DataFrame associating each
+    of these movies with its country of origin.
+    """
+    movies = df[unique_country_mask(df) & df.Movie_Countries.isin(countries)]
+    return movies, movies_and_countries(movies)
 
 
 def movies_and_countries(df: pd.DataFrame) -> pd.DataFrame:
@@ -56,44 +144,51 @@ def drop_duplicate_name(df: pd.DataFrame) -> pd.DataFrame:
 
 
 def align_movie_countries(
-    characters: pd.DataFrame, movies: pd.DataFrame
+    characters: pd.DataFrame, movies: Union[pd.DataFrame, "join.MovieDimension"]
 ) -> pd.DataFrame:
     """
     Adds the Movie_Countries column from the movies DataFrame to the character
     DataFrame.
-    """
-    return (
-        movies[["Wikipedia_Movie_ID", "Movie_Countries"]]
-        .drop_duplicates()
-        .merge(characters, on="Wikipedia_Movie_ID")
-    )
-
+    The movies can also be given as a join.MovieDimension, to reuse its index: the
+    rows then keep the order of the characters, with one row per country of their movie.
+    """
+    if isinstance(movies, join.MovieDimension):
+        aligned = movies.align(characters, ["Movie_Countries"])
+    else:
+        countries = movies[["Wikipedia_Movie_ID", "Movie_Countries"]].drop_duplicates()
+        movie_rows, character_rows = join.merge_indexers(
+            countries.Wikipedia_Movie_ID, characters.Wikipedia_Movie_ID
+        )
+        aligned = characters.take(character_rows).reset_index(drop=True)
+        for column in countries.columns:
+            aligned[column] = countries[column].take(movie_rows).array
+    columns = [c for c in characters.columns if c != "Wikipedia_Movie_ID"]
+    return aligned[["Wikipedia_Movie_ID", "Movie_Countries"] + columns]
 
 def align_year_and_decade(
-    summaries: pd.DataFrame, movies: pd.DataFrame
+    summaries: pd.DataFrame, movies: Union[pd.DataFrame, "join.MovieDimension"]
 ) -> pd.DataFrame:
     """
     Aligns the year and decade columns from the movies dataframe to the summaries
     dataframe.
+    The movies can also be given as a join.MovieDimension, with one row per summary.
     """
-    return summaries.merge(
-        movies[["Wikipedia_Movie_ID", "year", "decade"]],
-        on="Wikipedia_Movie_ID",
-        how="inner",
-    )
+    if isinstance(movies, join.MovieDimension):
+        return movies.align(summaries, ["year", "decade"])
+    return join.merge(summaries, movies, ["year", "decade"])
 
 def align_genres_and_name(
-    summaries: pd.DataFrame, movies: pd.DataFrame
+    summaries: pd.DataFrame, movies: Union[pd.DataFrame, "join.MovieDimension"]
 ) -> pd.DataFrame:
     """
-    Aligns the year and decade columns from the movies dataframe to the summaries
+    Aligns the genres and name columns from the movies dataframe to the summaries
     dataframe.
+    The movies can also be given as a join.MovieDimension, with one row per distinct
+    genre of the movie of each summary.
     """
-    return summaries.merge(
-        movies[["Wikipedia_Movie_ID", "Movie_Genres","Movie_Name"]],
-        on="Wikipedia_Movie_ID",
-        how="inner",
-    )
+    if isinstance(movies, join.MovieDimension):
+        return movies.align(summaries, ["Movie_Genres", "Movie_Name"])
+    return join.merge(summaries, movies, ["Movie_Genres", "Movie_Name"])
 
 
 def parse_dates(df: pd.DataFrame, column):
@@ -105,17 +200,24 @@ def parse_dates(df: pd.DataFrame, column):
     return df[~df[column].isna()].copy()
 
 
-def date_differences(movies: pd.DataFrame, characters: pd.DataFrame) -> int:
+def date_differences(
+    movies: Union[pd.DataFrame, "join.MovieDimension"], characters: pd.DataFrame
+) -> int:
     """
     Counts the number differences in movie release dates between the movies and characters
     DataFrame. This is used as a sanity check to see whether there are any inconsistencies.
-    """
-    merged = pd.merge(
-        movies[["Wikipedia_Movie_ID", "Movie_Release_Date"]],
-        characters[["Wikipedia_Movie_ID", "Movie_Release_Date"]],
-        on="Wikipedia_Movie_ID",
-    )
-    return (merged.Movie_Release_Date_x != merged.Movie_Release_Date_y).sum()
+    The movies can also be given as a join.MovieDimension, to compare each character
+    once with the release date of its movie.
+    """
+    if isinstance(movies, join.MovieDimension):
+        rows, dates = movies.gather(characters.Wikipedia_Movie_ID, ["Movie_Release_Date"])
+        movie_dates = dates.Movie_Release_Date.to_numpy()
+    else:
+        movie_rows, rows = join.merge_indexers(
+            movies.Wikipedia_Movie_ID, characters.Wikipedia_Movie_ID
+        )
+        movie_dates = movies.Movie_Release_Date.to_numpy()[movie_rows]
+    return (movie_dates != characters.Movie_Release_Date.to_numpy()[rows]).sum()
 
 
 def keep_dates(df: pd.DataFrame, min_year: int, max_year: int) -> pd.DataFrame:
@@ -151,6 +253,88 @@ def positive_age(df: pd.DataFrame) -> pd.DataFrame:
     )
 
 
+def filter_dated(
+    df: pd.DataFrame,
+    min_year: int,
+    max_year: int,
+    defined_actors: bool = False,
+    positive_ages: bool = False,
+) -> pd.DataFrame:
+    """
+    Applies parse_dates, keep_dates and add_year_and_decade, as well as
+    drop_undefined_actors and positive_age if requested, at once: the masks of all
+    filters are combined, and the kept rows are taken a single time instead of copying
+    the whole DataFrame after each filter. The given DataFrame is not modified.
+    """
+    release = pd.to_datetime(df.Movie_Release_Date, format="%Y/%m/%d", errors="coerce")
+    year = release.dt.year
+    mask = (year >= min_year) & (year <= max_year)
+    if defined_actors:
+        mask &= df.Freebase_Actor_ID.notna()
+    if positive_ages:
+        mask &= df.Actor_Age_at_Movie_Release > 0
+    rows = np.flatnonzero(mask.to_numpy())
+    result = df.take(rows)
+    result["Movie_Release_Date"] = release.to_numpy()[rows]
+    result["year"] = year.to_numpy()[rows].astype(np.int16)
+    result["decade"] = result.year - result.year % 10
+    return result
+
+
+def compact_dtypes(
+    df: pd.DataFrame, max_unique_ratio: float = 0.5, verbose: bool = False
+) -> pd.DataFrame:
+    """
+    Returns the DataFrame with a compact memory representation:
+    - string columns with repeated values (at most max_unique_ratio distinct values
+      per row) are categorical, other string columns are Arrow strings
+    - integer columns (IDs, years, decades) use the smallest integer type
+    - the columns of FLOAT32_COLUMNS are float32
+    The deep memory usage before and after, in MB, is stored in the memory_mb entry
+    of the attrs of the result (and printed if verbose is set).
+    Note that grouping by a categorical column should use observed=True, to leave out
+    categories that are no longer present after filtering.
+    """
+    columns = {}
+    for column, values in df.items():
+        if values.dtype == object or pd.api.types.is_string_dtype(values.dtype):
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                continue
+            if values.nunique() <= max_unique_ratio * len(values):
+                columns[column] = values.astype("category")
+            else:
+                columns[column] = values.astype("string[pyarrow]")
+        elif pd.api.types.is_integer_dtype(values.dtype):
+            columns[column] = pd.to_numeric(values, downcast="integer")
+        elif column in FLOAT32_COLUMNS:
+            columns[column] = values.astype(np.float32)
+    result = df.assign(**columns)
+    before = df.memory_usage(deep=True).sum() / 2**20
+    after = result.memory_usage(deep=True).sum() / 2**20
+    result.attrs["memory_mb"] = {"before": before, "after": after}
+    if verbose:
+        print(f"{before:,.1f} MB -> {after:,.1f} MB ({before / max(after, 1e-9):.1f}x smaller)")
+    return result
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compares the memory usage (deep=True) of each column of two versions of a
+    DataFrame, e.g. before and after compact_dtypes, in MB, with a total row.
+    """
+    report = pd.DataFrame(
+        {
+            "dtype_before": before.dtypes.astype(str),
+            "dtype_after": after.dtypes.astype(str),
+            "before_mb": before.memory_usage(deep=True, index=False) / 2**20,
+            "after_mb": after.memory_usage(deep=True, index=False) / 2**20,
+        }
+    )
+    report.loc["Total", ["before_mb", "after_mb"]] = report[["before_mb", "after_mb"]].sum()
+    report["ratio"] = report.before_mb / report.after_mb
+    return report
+
+
 def date_range(df1: pd.DataFrame, df2: pd.DataFrame) -> Tuple[pd.DataFrame, int]:
     """
     Remove data with inconsistent date formats.
@@ -161,6 +345,26 @@ def date_range(df1: pd.DataFrame, df2: pd.DataFrame) -> Tuple[pd.DataFrame, int]
     return df2.drop(labels=remove_idx, axis=0), remove_idx
 
 
+def year_difference(later: pd.Series, earlier: pd.Series) -> pd.Series:
+    """
+    Calculates the difference of the years of two date columns. Dates that cannot be
+    parsed give a missing difference.
+    """
+    later = pd.to_datetime(later, format="%Y/%m/%d", errors="coerce")
+    earlier = pd.to_datetime(earlier, format="%Y/%m/%d", errors="coerce")
+    return later.dt.year - earlier.dt.year
+
+
+def complete_dates(dates: pd.Series) -> pd.Series:
+    """
+    Returns whether each date has a year, a month and a day. Partial dates such as "1985"
+    or "1985/06" are parsed as the first day of the period. Parsed dates are complete.
+    """
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return pd.Series(True, index=dates.index)
+    return dates.astype("string").str.count(r"[-/]").eq(2).fillna(False).astype(bool)
+
+
 def calc_age(
     df1: pd.DataFrame, df2: pd.DataFrame, removed_idx: List[int]
 ) -> pd.DataFrame:
@@ -168,33 +372,20 @@ def calc_age(
     Calculates the age of the actors based on date of birth and movie release date. Age is added to dataframe if it
     was missing before.
     """
-
-    def year_diff(d1: datetime.datetime, d2: datetime.datetime):
-        """
-        Calculates the difference of given years
-        """
-        return d1.year - d2.year
-
-    df1.Actor_Age_at_Movie_Release = df1.apply(
-        lambda x: year_diff(x.Movie_Release_Date, x.Actor_DOB), axis=1
+    df1.Actor_Age_at_Movie_Release = year_difference(
+        df1.Movie_Release_Date, df1.Actor_DOB
     )
     try:
         df1 = df1.drop(labels=removed_idx, axis=0)
     except KeyError:
         df1 = df1
-    df2.Actor_Age_at_Movie_Release.loc[df1.index] = df1.Actor_Age_at_Movie_Release
+    df2.loc[df1.index, "Actor_Age_at_Movie_Release"] = df1.Actor_Age_at_Movie_Release
     return df2.copy()
 
 
 def apply_computed_age(original: pd.DataFrame, computed: pd.DataFrame):
-    def year_diff(d1: datetime.datetime, d2: datetime.datetime):
-        """
-        Calculates the difference of given years
-        """
-        return d1.year - d2.year
-
-    computed["Actor_Age_at_Movie_Release"] = computed.apply(
-        lambda x: year_diff(x.Movie_Release_Date, x.Actor_DOB), axis=1
+    computed["Actor_Age_at_Movie_Release"] = year_difference(
+        computed.Movie_Release_Date, computed.Actor_DOB
     )
     result = original.copy()
     result.loc[
@@ -203,12 +394,50 @@ def apply_computed_age(original: pd.DataFrame, computed: pd.DataFrame):
     return result
 
 
-def get_ethnicities(df: pd.DataFrame, freebase_ethnicity: List[Dict]) -> pd.DataFrame:
+def impute_ages(df: pd.DataFrame, exact: bool = False) -> pd.DataFrame:
     """
-    Creates mapping with JSON file and replaces Freebase IDs with corresponding terms for ethnic groups.
+    Fills the missing actor ages from the actors' date of birth and the movie release
+    date, in place. This replaces the release_birth_date, date_range and calc_age
+    sequence: as with date_range, actors with a missing age and a date of birth
+    that cannot be parsed are dropped.
+    By default the age is the difference of years, as in calc_age. If exact is set,
+    the age is decremented for actors whose birthday comes after the release day. Partial
+    dates (e.g. "1985", parsed as January 1) have no day to compare: their age stays the
+    difference of years, see complete_dates.
     """
-    fb_map = {}
-    for item in freebase_ethnicity:
-        fb_map[item["freebaseID"]] = item["itemLabel"]
+    release = pd.to_datetime(df.Movie_Release_Date, format="%Y/%m/%d", errors="coerce")
+    dob = pd.to_datetime(df.Actor_DOB, format="%Y/%m/%d", errors="coerce")
+    missing = df.Actor_Age_at_Movie_Release.isna() & df.Movie_Release_Date.notna()
+    invalid = missing & df.Actor_DOB.notna() & dob.isna()
+    fill = missing & dob.notna() & release.notna()
+
+    ages = release.dt.year - dob.dt.year
+    if exact:
+        before_birthday = (release.dt.month < dob.dt.month) | (
+            (release.dt.month == dob.dt.month) & (release.dt.day < dob.dt.day)
+        )
+        before_birthday &= complete_dates(df.Movie_Release_Date) & complete_dates(df.Actor_DOB)
+        ages -= before_birthday.astype(int)
+    df.loc[fill, "Actor_Age_at_Movie_Release"] = ages[fill]
+    return df[~invalid] if invalid.any() else df
+
 
-    return df.replace({"Actor_Ethnicity": fb_map})
+def get_ethnicities(
+    df: pd.DataFrame,
+    freebase_ethnicity: Optional[List[Dict]] = None,
+    categorical: bool = False,
+) -> pd.DataFrame:
+    """
+    Replaces Freebase IDs with corresponding terms for ethnic groups, from the given
+    Wikidata query results, or by default from the query results file (read once).
+    IDs without term are kept. The ethnicities keep the type of the given column
+    (e.g. object), unless categorical is set.
+    """
+    if freebase_ethnicity is None:
+        resolver = resolve.Resolver.load()
+    else:
+        resolver = resolve.Resolver.from_records(freebase_ethnicity)
+    ethnicities, _ = resolver.resolve(df.Actor_Ethnicity)
+    if not categorical and not isinstance(df.Actor_Ethnicity.dtype, pd.CategoricalDtype):
+        ethnicities = ethnicities.astype(df.Actor_Ethnicity.dtype)
+    return df.assign(Actor_Ethnicity=ethnicities)
@@ -0,0 +1,228 @@
+"""
+Command-line entry point running the analysis without the notebook.
+Run from the repository root:
+
+    python -m src build
+    python -m src stats --jobs 5
+    python -m src keypoints --jobs 8
+    python -m src wordcloud --by decade --jobs 4
+    python -m src prune --max-mb 500
+
+Exits with status 0 on success, 1 on error and 130 when interrupted, and prints the
+time spent in each stage.
+"""
+import argparse
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Sequence
+
+import pandas as pd
+
+if __package__:
+    from . import aggregate, cache, instrument, load, pipeline, resolve
+else:
+    import aggregate
+    import cache
+    import instrument
+    import load
+    import pipeline
+    import resolve
+
+# Data directory, relative to the repository root
+DATA_DIR = "data"
+
+# Metrics of the stats command, see aggregate.group_metrics
+STATS_METRICS = [
+    ("count", "Freebase_Actor_ID"),
+    ("nunique", "Freebase_Actor_ID"),
+    ("nunique", "Actor_Ethnicity"),
+    ("top_n", "Actor_Gender", 2),
+    ("describe", "Actor_Age_at_Movie_Release"),
+    ("describe", "Actor_Height"),
+]
+
+
+def set_data_dir(directory: str):
+    """
+    Points the loaders and the caches to the given data directory.
+    """
+    movies_dir = f"{directory}/MovieSummaries"
+    load.DATA_DIR = directory
+    load.MOVIES_DIR = movies_dir
+    load.CHARACTER_META_FILE = f"{movies_dir}/character.metadata.tsv"
+    load.MOVIE_META_FILE = f"{movies_dir}/movie.metadata.tsv"
+    load.NAME_CLUSTERS = f"{movies_dir}/name.clusters.txt"
+    load.PLOT_SUM = f"{movies_dir}/plot_summaries.txt"
+    load.TVTROPES_CLUSTERS = f"{movies_dir}/tvtropes.clusters.txt"
+    cache.CACHE_DIR = f"{directory}/cache"
+    resolve.QUERY_FILE = f"{directory}/query.json"
+    resolve.MAPPING_FILE = f"{directory}/freebase_labels.parquet"
+
+
+def datasets(args: argparse.Namespace) -> pipeline.Pipeline:
+    return pipeline.datasets(
+        args.countries, args.min_year, args.max_year, verbose=args.verbose, compact=args.compact
+    )
+
+
+def run_tasks(func: Callable, tasks: List[tuple], jobs: int) -> list:
+    """
+    Runs func on each task, in a pool of jobs processes if jobs > 1. Tasks pass
+    DataFrames by the path of their Parquet file, which each process reads.
+    """
+    if jobs <= 1:
+        return [func(*task) for task in tasks]
+    with ProcessPoolExecutor(jobs) as pool:
+        return list(pool.map(func, *zip(*tasks)))
+
+
+def read_group(path: str, column: str, value, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Reads the rows of a Parquet file with the given value of a column.
+    """
+    return pd.read_parquet(path, columns=columns, filters=[(column, "==", value)])
+
+
+def group_stats(path: str, country: str) -> pd.DataFrame:
+    """
+    Statistics of the characters of one country per decade.
+    """
+    return aggregate.group_metrics(read_group(path, "Movie_Countries", country), STATS_METRICS)
+
+
+def group_words(path: str, column: str, value, n: int) -> pd.DataFrame:
+    """
+    Most frequent words of the plot summaries of one group.
+    """
+    if __package__:
+        from . import bow
+    else:
+        import bow
+
+    summaries = read_group(path, column, value, ["Wikipedia_Movie_ID", "Summary", column])
+    bag = bow.BagOfWords().add(summaries)
+    return bag.frame(summaries, column, n)
+
+
+def build(args: argparse.Namespace):
+    with instrument.stage("build"):
+        datasets(args).run()
+
+
+def stats(args: argparse.Namespace):
+    with instrument.stage("datasets"):
+        steps = datasets(args)
+        steps.run("D3")
+    with instrument.stage("stats"):
+        tasks = [(steps.path("D3"), country) for country in args.countries]
+        df = pd.concat(run_tasks(group_stats, tasks, args.jobs), ignore_index=True)
+    output = args.output or f"{args.data}/stats.csv"
+    df.to_csv(output, index=False)
+    print(f"{len(df):,} statistics written to {output}")
+
+
+def keypoints(args: argparse.Namespace):
+    if __package__:
+        from . import embeddings, keypoints as keypoint_extraction, nlp_modules
+    else:
+        import embeddings
+        import keypoints as keypoint_extraction
+        import nlp_modules
+
+    with instrument.stage("datasets"):
+        summaries = datasets(args).run("D2")["D2"]
+    with instrument.stage("model"):
+        model = embeddings.EmbeddingStore(
+            nlp_modules.get_model(args.model), args.model, f"{args.data}/embeddings"
+        )
+    with instrument.stage("keypoints"):
+        keypoint_extraction.run(
+            summaries.drop_duplicates("Wikipedia_Movie_ID"),
+            model,
+            output=args.output or f"{args.data}/keypoints.parquet",
+            jobs=args.jobs,
+        )
+
+
+def wordcloud(args: argparse.Namespace):
+    with instrument.stage("datasets"):
+        steps = datasets(args)
+        summaries = steps.run("D2")["D2"]
+    with instrument.stage("words"):
+        values = sorted(summaries[args.by].dropna().unique())
+        tasks = [(steps.path("D2"), args.by, value, args.words) for value in values]
+        df = pd.concat(run_tasks(group_words, tasks, args.jobs), ignore_index=True)
+    output = args.output or f"{args.data}/words_{args.by}.csv"
+    df.to_csv(output, index=False)
+    print(f"Word counts of {len(values)} groups written to {output}")
+
+
+def prune(args: argparse.Namespace):
+    removed = cache.prune(args.max_mb)
+    print(f"{len(removed)} least recently used cache entries removed")
+
+
+def parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--data", default=DATA_DIR, help="data directory")
+    common.add_argument("--countries", nargs="+", default=pipeline.COUNTRIES)
+    common.add_argument("--min-year", type=int, default=pipeline.MIN_YEAR)
+    common.add_argument("--max-year", type=int, default=pipeline.MAX_YEAR)
+    common.add_argument("--jobs", type=int, default=1, help="number of processes")
+    common.add_argument("--output", help="output file")
+    common.add_argument("--verbose", action="store_true")
+    common.add_argument(
+        "--compact", action="store_true", help="categorical strings and small numeric types"
+    )
+
+    parser = argparse.ArgumentParser(prog="python -m src", description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser(
+        "build", parents=[common], help="build the cached D1, D2 and D3 datasets"
+    ).set_defaults(func=build)
+    commands.add_parser(
+        "stats", parents=[common], help="character statistics per country and decade"
+    ).set_defaults(func=stats)
+    command = commands.add_parser(
+        "keypoints", parents=[common], help="key points of all plot summaries"
+    )
+    command.add_argument("--model", default="all-MiniLM-L6-v2")
+    command.set_defaults(func=keypoints)
+    command = commands.add_parser(
+        "wordcloud", parents=[common], help="most frequent words of the plot summaries per group"
+    )
+    command.add_argument("--by", default="Movie_Countries", choices=["Movie_Countries", "decade"])
+    command.add_argument("--words", type=int, default=100)
+    command.set_defaults(func=wordcloud)
+    command = commands.add_parser(
+        "prune", parents=[common], help="remove the least recently used cache entries"
+    )
+    command.add_argument("--max-mb", type=float, default=cache.MAX_SIZE_MB, help="size of the cache")
+    command.set_defaults(func=prune)
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parser().parse_args(argv)
+    set_data_dir(args.data)
+    instrument.reset()
+    start = time.perf_counter()
+    status = 0
+    try:
+        args.func(args)
+    except KeyboardInterrupt:
+        print("Interrupted", file=sys.stderr)
+        status = 130
+    except Exception as e:
+        if args.verbose:
+            traceback.print_exc(file=sys.stderr)
+        else:
+            print(f"ERROR: {type(e).__name__}: {e} (--verbose for the traceback)", file=sys.stderr)
+        status = 1
+
+    for record in instrument.report().itertuples():
+        print(f"{record.function:>12}: {record.wall:8.2f}s wall {record.cpu:8.2f}s CPU")
+    print(f"{args.command} {'succeeded' if status == 0 else 'failed'} in {time.perf_counter() - start:.2f}s")
+    return status
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from typing import Tuple
+if __package__:
+    from . import aggregate, nlp_modules
+else:
+    import aggregate
+    import nlp_modules
+
+# Number of embedding rows processed at once
+BLOCK_SIZE = 65536
+
+
+def group_indicator(rows: np.ndarray, keys: pd.DataFrame, n: int):
+    """
+    Builds the sparse (groups x embedding rows) indicator matrix from pairs of an embedding
+    row and the keys of one of its groups. A row can belong to several groups, e.g. one
+    per genre of its movie. Returns the indicator (in CSC format, for column slicing)
+    and the keys of each group.
+    """
+    codes, groups = aggregate.group_codes(keys, list(keys.columns))
+    valid = codes >= 0
+    indicator = sparse.csc_matrix(
+        (np.ones(valid.sum(), dtype=np.float32), (codes[valid], np.asarray(rows)[valid])),
+        shape=(len(groups), n),
+    )
+    return indicator, groups
+
+
+def group_sums(
+    embeddings: np.ndarray, rows: np.ndarray, keys: pd.DataFrame, block_size: int = BLOCK_SIZE
+) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    """
+    Sums the unit-norm embeddings of each group in one streaming pass over blocks of rows,
+    such that the embeddings can be a memory-mapped matrix larger than memory.
+    rows and keys give the groups of each embedding row, e.g. the (country, genre, decade)
+    of the movie of each sentence, as in group_indicator.
+    Returns the keys of each group, the sums and the number of rows of each group.
+    """
+    n = len(embeddings)
+    indicator, groups = group_indicator(rows, keys, n)
+    sums = np.zeros((len(groups), embeddings.shape[1]), dtype=np.float64)
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        sums += indicator[:, start:stop] @ nlp_modules.normalize_rows(embeddings[start:stop])
+    counts = np.asarray(indicator.sum(axis=1)).ravel()
+    return groups, sums, counts
+
+
+def group_centroids(
+    embeddings: np.ndarray, rows: np.ndarray, keys: pd.DataFrame, block_size: int = BLOCK_SIZE
+) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    """
+    Computes the centroid of the unit-norm embeddings of each group, see group_sums.
+    Returns the keys of each group, the centroids and the number of rows of each group.
+    """
+    groups, sums, counts = group_sums(embeddings, rows, keys, block_size)
+    return groups, sums / np.maximum(counts, 1)[:, None], counts
+
+
+def group_similarity(
+    groups: pd.DataFrame, sums: np.ndarray, counts: np.ndarray, mean_pairwise: bool = False
+) -> pd.DataFrame:
+    """
+    Returns the (groups x groups) similarity matrix from the output of group_sums.
+    By default, it is the cosine similarity of the group centroids. If mean_pairwise is set,
+    it is the exact mean cosine similarity over all pairs of rows of the two groups, as
+    the mean of a_i . b_j over all pairs is the dot product of the sums divided by both sizes.
+    """
+    if mean_pairwise:
+        similarity = (sums @ sums.T) / np.maximum(np.outer(counts, counts), 1)
+    else:
+        centroids = nlp_modules.normalize_rows(sums)
+        similarity = centroids @ centroids.T
+    index = pd.MultiIndex.from_frame(groups)
+    return pd.DataFrame(similarity, index=index, columns=index)
+
+
+def minibatch_clusters(
+    embeddings: np.ndarray,
+    n_clusters: int,
+    method: str = "kmeans",
+    epochs: int = 1,
+    block_size: int = BLOCK_SIZE,
+    random_state: int = 0,
+    threshold: float = 0.5,
+):
+    """
+    Clusters embeddings block by block, as a scalable alternative to agglomerative
+    clustering, which needs the full pairwise distance matrix.
+    method is either "kmeans" (mini-batch k-means) or "birch" (BIRCH, whose subclusters
+    are grouped into n_clusters). For BIRCH, threshold is the maximum radius of a
+    subcluster: larger values give fewer subclusters and a faster fit.
+    Returns the cluster label of each row and the model.
+    """
+    from sklearn.cluster import Birch, MiniBatchKMeans
+
+    if method == "kmeans":
+        model = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state, n_init=3)
+    elif method == "birch":
+        model = Birch(n_clusters=None, threshold=threshold)
+        epochs = 1
+    else:
+        raise ValueError(f"Unknown clustering method {method}")
+
+    n = len(embeddings)
+    for _ in range(epochs):
+        for start in range(0, n, block_size):
+            model.partial_fit(nlp_modules.normalize_rows(embeddings[start : start + block_size]))
+    if method == "birch":
+        # Group the subclusters into the requested number of clusters
+        from sklearn.cluster import AgglomerativeClustering
+
+        model.set_params(n_clusters=AgglomerativeClustering(n_clusters=n_clusters))
+        model.partial_fit()
+
+    labels = np.concatenate(
+        [
+            model.predict(nlp_modules.normalize_rows(embeddings[start : start + block_size]))
+            for start in range(0, n, block_size)
+        ]
+    )
+    return labels, model
@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from collections.abc import Iterable
+from typing import Callable, Dict, Union
+if __package__:
+    from . import bow
+else:
+    import bow
+
+# A group of summaries: either a dictionary of column values, e.g.
+# {"Movie_Countries": "France", "decade": [1990, 2000]}, or a function returning a
+# boolean mask over the rows of the aligned summaries
+Predicate = Union[Dict, Callable[[pd.DataFrame], pd.Series]]
+
+
+def _values(values) -> tuple:
+    """
+    Returns the accepted values of a column of a predicate: a single value (including
+    strings) or any collection of values, e.g. a list, a numpy array or a pandas Index.
+    """
+    if isinstance(values, (str, bytes)) or not isinstance(values, Iterable):
+        return (values,)
+    return tuple(values)
+
+
+def _freeze(predicate: Dict) -> tuple:
+    return tuple(sorted((column, _values(values)) for column, values in predicate.items()))
+
+
+class TermContrast:
+    """
+    Finds the terms that distinguish the plot summaries of two groups, e.g. French
+    dramas of the 1990s against US dramas of the 1990s.
+    The summaries are given aligned with their attributes, e.g. by align_year_and_decade
+    and align_genres_and_name (there may be several rows per movie, one per genre).
+    The term counts of each group are a sparse product of the bag-of-words matrix with
+    the group membership vector, and are cached, such that repeated queries on the same
+    groups only compute the scores. The caches are cleared when summaries are added to
+    the bag of words.
+    """
+
+    def __init__(self, bag: bow.BagOfWords, aligned: pd.DataFrame, cache_size: int = 256):
+        self.bow = bag
+        self.aligned = aligned
+        self.cache_size = cache_size
+        self._counts: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._documents = None
+        self._refresh()
+
+    def _refresh(self):
+        """
+        Recomputes the background counts and clears the counts of the groups if the
+        bag of words changed since they were computed.
+        """
+        if self._documents == len(self.bow.ids):
+            return
+        self._documents = len(self.bow.ids)
+        self._counts.clear()
+        self.background = np.asarray(self.bow.counts.sum(axis=0)).ravel().astype(np.float64)
+
+    def mask(self, predicate: Predicate) -> pd.Series:
+        """
+        Returns the mask of the aligned rows matching the predicate.
+        """
+        if callable(predicate):
+            return predicate(self.aligned)
+        mask = pd.Series(True, index=self.aligned.index)
+        for column, values in predicate.items():
+            mask &= self.aligned[column].isin(_values(values))
+        return mask
+
+    def counts(self, predicate: Predicate) -> np.ndarray:
+        """
+        Returns the total count of each term over the summaries of the group.
+        Each summary is counted once, even if it matches through several rows.
+        """
+        self._refresh()
+        key = None if callable(predicate) else _freeze(predicate)
+        if key in self._counts:
+            self._counts.move_to_end(key)
+            return self._counts[key]
+        movies = self.aligned.Wikipedia_Movie_ID[self.mask(predicate)].unique()
+        members = np.isin(self.bow.ids, movies).astype(np.float64)
+        counts = np.asarray(self.bow.counts.T @ members).ravel()
+        if key is not None:
+            self._counts[key] = counts
+            if len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+        return counts
+
+    def distinctive_terms(
+        self,
+        group_a: Predicate,
+        group_b: Predicate,
+        n: int = 20,
+        method: str = "log_odds",
+        prior: float = 500,
+    ) -> pd.DataFrame:
+        """
+        Returns the n terms most characteristic of group a compared to group b.
+        method is either:
+        - "log_odds": z-scores of the log-odds ratio with an informative Dirichlet prior
+          (Monroe et al., 2008), proportional to the term frequencies over all summaries
+          and of total weight prior. Rare terms are shrunk towards the background.
+        - "tfidf": difference of the unit-norm TF-IDF vectors of the two groups.
+        Negative scores are characteristic of group b.
+        """
+        counts_a, counts_b = self.counts(group_a), self.counts(group_b)
+        if method == "log_odds":
+            alpha = prior * self.background / max(self.background.sum(), 1)
+            # Terms that never occur get no prior and would divide by zero
+            alpha = np.maximum(alpha, 1e-9)
+            n_a, n_b, a0 = counts_a.sum(), counts_b.sum(), alpha.sum()
+            log_odds_a = np.log(counts_a + alpha) - np.log(n_a + a0 - counts_a - alpha)
+            log_odds_b = np.log(counts_b + alpha) - np.log(n_b + a0 - counts_b - alpha)
+            variance = 1 / (counts_a + alpha) + 1 / (counts_b + alpha)
+            scores = (log_odds_a - log_odds_b) / np.sqrt(variance)
+        elif method == "tfidf":
+            weights = self.bow.tfidf(np.vstack([counts_a, counts_b])).toarray()
+            scores = weights[0] - weights[1]
+        else:
+            raise ValueError(f"Unknown method {method}")
+
+        top = np.argsort(-scores, kind="stable")[:n]
+        return pd.DataFrame(
+            {
+                "word": np.asarray(self.bow.terms, dtype=object)[top],
+                "score": scores[top],
+                "count_a": counts_a[top].astype(np.int64),
+                "count_b": counts_b[top].astype(np.int64),
+            }
+        )
@@ -0,0 +1,242 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Sequence
+
+# Dimensions of the cube
+DIMENSIONS = ["Movie_Countries", "decade", "Movie_Genres", "Actor_Gender"]
+# Numeric columns with additive measures (count, sum, sum of squares, min, max)
+NUMERIC = ["Actor_Age_at_Movie_Release", "Actor_Height"]
+# Columns with distinct count sketches
+DISTINCT = {"actors": "Freebase_Actor_ID", "ethnicities": "Actor_Ethnicity"}
+# Label of the genre member aggregating all genres. A character is counted once per
+# genre of its movie, so rolling up genres uses this member instead of a sum.
+ALL_GENRES = "All"
+# Label of missing genders and of the genres outside the most frequent ones
+UNKNOWN = "Unknown"
+OTHER = "Other"
+
+
+def hll_registers(values: pd.Series, cells: np.ndarray, ncells: int, p: int) -> np.ndarray:
+    """
+    Builds one HyperLogLog sketch of the distinct values of each cell, with 2^p registers.
+    """
+    valid = values.notna().to_numpy()
+    hashes = pd.util.hash_array(values[valid].astype(str).to_numpy())
+    registers = (hashes >> np.uint64(64 - p)).astype(np.int64)
+    # Rank of the first set bit in the remaining 64 - p bits
+    rest = (hashes & np.uint64((1 << (64 - p)) - 1)).astype(np.float64)
+    bits = np.where(rest > 0, np.floor(np.log2(np.maximum(rest, 1))) + 1, 0)
+    ranks = (64 - p - bits + 1).astype(np.uint8)
+    sketches = np.zeros((ncells, 1 << p), dtype=np.uint8)
+    np.maximum.at(sketches, (cells[valid], registers), ranks)
+    return sketches
+
+
+def hll_estimate(sketches: np.ndarray) -> np.ndarray:
+    """
+    Estimates the number of distinct values from HyperLogLog sketches (last axis).
+    """
+    m = sketches.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m**2 / np.sum(2.0 ** -sketches.astype(np.float64), axis=-1)
+    zeros = np.sum(sketches == 0, axis=-1)
+    # Linear counting for small cardinalities
+    with np.errstate(divide="ignore"):
+        linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+class Cube:
+    """
+    Materialized country x decade x genre x gender cube of the character dataset (D3).
+    Each cell stores the number of characters, additive measures of the numeric columns,
+    the number of known ethnicities, and HyperLogLog sketches of the distinct actors and
+    ethnicities. Slicing and roll-ups only touch the cells, never the row-level data.
+    """
+
+    def __init__(self, labels: Dict[str, pd.Index], measures: Dict[str, np.ndarray]):
+        self.labels = labels
+        self.measures = measures
+
+    @staticmethod
+    def build(
+        characters: pd.DataFrame,
+        genres: pd.DataFrame,
+        top_genres: int = 20,
+        p: int = 8,
+    ) -> "Cube":
+        """
+        Builds the cube from the characters (D3, with Movie_Countries and decade) and a
+        table associating movie IDs with their genres (e.g. D1). Genres beyond the
+        top_genres most frequent ones are grouped as Other.
+        Distinct counts have a relative error of about 1.04 / sqrt(2^p).
+        """
+        genres = genres[["Wikipedia_Movie_ID", "Movie_Genres"]].dropna().drop_duplicates()
+        frequent = genres.Movie_Genres.value_counts().index[:top_genres]
+        genres = genres.assign(
+            Movie_Genres=genres.Movie_Genres.where(genres.Movie_Genres.isin(frequent), OTHER)
+        ).drop_duplicates()
+
+        # One row per character for the All genres member, and one per genre of its movie
+        characters = characters.reset_index(drop=True)
+        linked = (
+            characters[["Wikipedia_Movie_ID"]]
+            .reset_index()
+            .merge(genres, on="Wikipedia_Movie_ID")
+        )
+        rows = np.concatenate([np.arange(len(characters)), linked["index"].to_numpy()])
+        genre = pd.concat(
+            [pd.Series(ALL_GENRES, index=characters.index), linked.Movie_Genres],
+            ignore_index=True,
+        )
+        expanded = characters.iloc[rows].reset_index(drop=True)
+        expanded["Movie_Genres"] = genre
+        expanded["Actor_Gender"] = expanded.Actor_Gender.astype(object).fillna(UNKNOWN)
+
+        codes, labels = [], {}
+        for dimension in DIMENSIONS:
+            dimension_codes, uniques = pd.factorize(expanded[dimension], sort=True)
+            codes.append(dimension_codes)
+            labels[dimension] = uniques
+        shape = tuple(len(labels[d]) for d in DIMENSIONS)
+        valid = np.all([c >= 0 for c in codes], axis=0)
+        cells = np.ravel_multi_index([c[valid] for c in codes], shape)
+        expanded = expanded[valid].reset_index(drop=True)
+        ncells = int(np.prod(shape))
+
+        measures = {"count": np.bincount(cells, minlength=ncells)}
+        for column in NUMERIC:
+            values = expanded[column].to_numpy(dtype=float, na_value=np.nan)
+            known = ~np.isnan(values)
+            grouped = pd.Series(values[known]).groupby(cells[known])
+            measures[f"n_{column}"] = np.bincount(cells[known], minlength=ncells)
+            measures[f"sum_{column}"] = np.bincount(cells[known], values[known], ncells)
+            measures[f"sumsq_{column}"] = np.bincount(
+                cells[known], values[known] ** 2, ncells
+            )
+            for stat in ["min", "max"]:
+                result = np.full(ncells, np.nan)
+                aggregated = grouped.agg(stat)
+                result[aggregated.index.to_numpy()] = aggregated.to_numpy()
+                measures[f"{stat}_{column}"] = result
+        measures["n_Actor_Ethnicity"] = np.bincount(
+            cells[expanded.Actor_Ethnicity.notna().to_numpy()], minlength=ncells
+        )
+        for name, column in DISTINCT.items():
+            measures[f"hll_{name}"] = hll_registers(expanded[column], cells, ncells, p)
+
+        return Cube(
+            labels,
+            {
+                name: values.reshape(shape + values.shape[1:])
+                for name, values in measures.items()
+            },
+        )
+
+    def select(self, **members: Sequence) -> "Cube":
+        """
+        Returns the sub-cube with the given members of each dimension, e.g.
+        cube.select(Movie_Countries=["France", "Japan"], decade=[1990, 2000]).
+        """
+        labels, measures = dict(self.labels), dict(self.measures)
+        for dimension, values in members.items():
+            axis = DIMENSIONS.index(dimension)
+            positions = self.labels[dimension].get_indexer(list(values))
+            positions = positions[positions >= 0]
+            labels[dimension] = self.labels[dimension].take(positions)
+            measures = {
+                name: np.take(array, positions, axis=axis)
+                for name, array in measures.items()
+            }
+        return Cube(labels, measures)
+
+    def rollup(self, by: Sequence[str]) -> pd.DataFrame:
+        """
+        Aggregates the cells over all dimensions except the given ones, and returns one
+        row per combination of their members, with the counts, means, standard
+        deviations, minimums, maximums and distinct count estimates.
+        """
+        by = list(by)
+        genres = self.labels["Movie_Genres"]
+        all_genres = genres == ALL_GENRES
+        # Rolling up genres uses the All member, grouping by genre excludes it
+        cube = self.select(
+            Movie_Genres=genres[~all_genres] if "Movie_Genres" in by else genres[all_genres]
+        )
+        axes = tuple(i for i, d in enumerate(DIMENSIONS) if d not in by)
+        # Order of the kept axes, to return the members in the order of by
+        kept = [d for d in DIMENSIONS if d in by]
+        order = [kept.index(d) for d in by]
+
+        result = {}
+        for name, array in cube.measures.items():
+            if name.startswith("min_"):
+                with np.errstate(invalid="ignore"):
+                    result[name] = np.fmin.reduce(array, axis=axes) if axes else array
+            elif name.startswith("max_"):
+                result[name] = np.fmax.reduce(array, axis=axes) if axes else array
+            elif name.startswith("hll_"):
+                merged = np.max(array, axis=axes) if axes else array
+                result[f"distinct_{name[4:]}"] = hll_estimate(merged)
+            else:
+                result[name] = array.sum(axis=axes) if axes else array
+        for column in NUMERIC:
+            n = result[f"n_{column}"]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = result[f"sum_{column}"] / n
+                variance = (result[f"sumsq_{column}"] - n * mean**2) / (n - 1)
+            result[f"mean_{column}"] = mean
+            result[f"std_{column}"] = np.sqrt(np.maximum(variance, 0))
+
+        if len(by) == 1:
+            index = cube.labels[by[0]].rename(by[0])
+        else:
+            index = pd.MultiIndex.from_product([cube.labels[d] for d in by], names=by)
+        return pd.DataFrame(
+            {
+                name: np.ravel(np.transpose(values, order + list(range(len(by), values.ndim))))
+                for name, values in result.items()
+            },
+            index=index,
+        )
+
+    def gender_ratio(self) -> pd.DataFrame:
+        """
+        Gender ratio (female / male) per decade and country, as load.gender_ratio.
+        """
+        counts = self.rollup(["decade", "Movie_Countries", "Actor_Gender"])["count"]
+        counts = counts.unstack("Actor_Gender")
+        return pd.DataFrame({"Ratio F/M": counts["F"] / counts["M"]})
+
+    def ethnicities_country(self) -> pd.Series:
+        """
+        Estimated number of different ethnicities per country and decade, as
+        aggregate.ethnicities_country.
+        """
+        return self.rollup(["Movie_Countries", "decade"])["distinct_ethnicities"]
+
+    def ethnicity_ratio(self) -> pd.Series:
+        """
+        Estimated number of different ethnicities over the number of actors with a known
+        ethnicity, per country and decade, as load.ethnicity_ratio.
+        """
+        rolled = self.rollup(["Movie_Countries", "decade"])
+        return rolled.distinct_ethnicities / rolled.n_Actor_Ethnicity
+
+    def max_min(self, column: str) -> pd.DataFrame:
+        """
+        Minimum and maximum of a numeric column per country and decade, as aggregate.max_min.
+        """
+        rolled = self.rollup(["Movie_Countries", "decade"])
+        return rolled[[f"min_{column}", f"max_{column}"]]
+
+    def stats_age_by_country(self) -> pd.DataFrame:
+        """
+        Count, mean, standard deviation, minimum and maximum of the actors' ages per
+        country, as aggregate.stats_age_by_country (quartiles are not additive and are
+        not part of the cube).
+        """
+        column = "Actor_Age_at_Movie_Release"
+        rolled = self.rollup(["Movie_Countries"])
+        stats = [f"n_{column}", f"mean_{column}", f"std_{column}", f"min_{column}", f"max_{column}"]
+        return rolled[stats].set_axis(["count", "mean", "std", "min", "max"], axis=1)
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Sequence
+
+# Directory of the persistent embedding stores, next to the raw data
+EMBEDDINGS_DIR = "../data/embeddings"
+# Model used to embed the plot summaries
+MODEL_NAME = "all-MiniLM-L6-v2"
+# Size of a sentence digest in bytes
+DIGEST_SIZE = 16
+
+
+def sentence_digest(sentence: str) -> bytes:
+    """
+    Returns the content hash identifying a sentence in the store.
+    """
+    return hashlib.blake2b(sentence.encode(), digest_size=DIGEST_SIZE).digest()
+
+
+class EmbeddingStore:
+    """
+    Persistent store of sentence embeddings, keyed on the content hash of each sentence.
+    The embeddings are appended to a memory-mapped matrix on disk, along with an index
+    of sentence digests, and the most recently used embeddings are kept in memory.
+    The store exposes the same encode method as the sentence transformer model, so it
+    can be passed wherever nlp_modules expects a model: each distinct sentence is then
+    encoded exactly once across calls and runs, in batches.
+    Only one process should write to a given store at a time.
+    """
+
+    def __init__(
+        self,
+        model,
+        name: str = MODEL_NAME,
+        directory: str = EMBEDDINGS_DIR,
+        dtype: str = "float32",
+        memory_size: int = 100_000,
+        batch_size: int = 64,
+    ):
+        self.model = model
+        self.directory = f"{directory}/{name}"
+        self.dtype = np.dtype(dtype)
+        self.memory_size = memory_size
+        self.batch_size = batch_size
+        self.matrix_path = f"{self.directory}/embeddings.{self.dtype.name}.bin"
+        self.index_path = f"{self.directory}/index.{self.dtype.name}.bin"
+        self.meta_path = f"{self.directory}/meta.{self.dtype.name}.json"
+        self._recent: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._rows: Dict[bytes, int] = {}
+        self._matrix = None
+        self.dim = None
+        self._load()
+
+    def _load(self):
+        """
+        Reads the index of the store from disk, if it exists.
+        """
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path) as f:
+            self.dim = json.load(f)["dim"]
+        for path in [self.matrix_path, self.index_path]:
+            # The write of the first embeddings may have been interrupted
+            open(path, "ab").close()
+        with open(self.index_path, "rb") as f:
+            index = f.read()
+        # An interrupted write may leave more index entries than embeddings, or the
+        # opposite: both files are truncated to the complete rows, such that new rows
+        # are appended right after them
+        row_bytes = self.dim * self.dtype.itemsize
+        count = min(
+            len(index) // DIGEST_SIZE, os.path.getsize(self.matrix_path) // row_bytes
+        )
+        os.truncate(self.index_path, count * DIGEST_SIZE)
+        os.truncate(self.matrix_path, count * row_bytes)
+        self._rows = {
+            index[i * DIGEST_SIZE : (i + 1) * DIGEST_SIZE]: i for i in range(count)
+        }
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, sentence: str) -> bool:
+        return sentence_digest(sentence) in self._rows
+
+    def matrix(self) -> np.ndarray:
+        """
+        Returns the memory-mapped matrix of all stored embeddings.
+        """
+        if self._matrix is None or len(self._matrix) != len(self._rows):
+            self._matrix = np.memmap(
+                self.matrix_path, dtype=self.dtype, mode="r", shape=(len(self), self.dim)
+            )
+        return self._matrix
+
+    def _append(self, digests: List[bytes], embeddings: np.ndarray):
+        """
+        Appends new embeddings and their digests to the files of the store.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+            with open(self.meta_path, "w") as f:
+                json.dump({"dim": self.dim, "dtype": self.dtype.name}, f)
+        with open(self.matrix_path, "ab") as f:
+            f.write(np.ascontiguousarray(embeddings, dtype=self.dtype).tobytes())
+        with open(self.index_path, "ab") as f:
+            f.write(b"".join(digests))
+        for digest in digests:
+            self._rows[digest] = len(self._rows)
+
+    def _remember(self, digest: bytes, embedding: np.ndarray):
+        """
+        Keeps an embedding in memory, evicting the least recently used one if needed.
+        """
+        self._recent[digest] = embedding
+        self._recent.move_to_end(digest)
+        if len(self._recent) > self.memory_size:
+            self._recent.popitem(last=False)
+
+    def encode(self, sentences: Sequence[str], **kwargs) -> np.ndarray:
+        """
+        Returns the embeddings of the given sentences as a float32 matrix.
+        Sentences that are not in the store yet are de-duplicated, encoded in
+        batches by the model and added to the store.
+        """
+        digests = [sentence_digest(s) for s in sentences]
+        distinct = dict(zip(digests, sentences))
+        found = {d: self._recent[d] for d in distinct if d in self._recent}
+
+        # Read the embeddings that are not in memory from disk, in row order
+        on_disk = sorted(
+            (self._rows[d], d) for d in distinct if d not in found and d in self._rows
+        )
+        if on_disk:
+            rows = np.array([row for row, _ in on_disk])
+            found.update(zip((d for _, d in on_disk), self.matrix()[rows]))
+
+        missing = [d for d in distinct if d not in found]
+        if missing:
+            kwargs.setdefault("batch_size", self.batch_size)
+            encoded = np.asarray(
+                self.model.encode([distinct[d] for d in missing], **kwargs),
+                dtype=np.float32,
+            )
+            self._append(missing, encoded)
+            found.update(zip(missing, encoded.astype(self.dtype)))
+
+        for digest, embedding in found.items():
+            self._remember(digest, embedding)
+        result = np.empty((len(sentences), self.dim or 0), dtype=np.float32)
+        for i, digest in enumerate(digests):
+            result[i] = found[digest]
+        return result
@@ -1,6 +1,10 @@
+import numpy as np
 import pandas as pd
-import aggregate
-from typing import Tuple
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+if __package__:
+    from . import aggregate
+else:
+    import aggregate
 
 
 def runtimes(movies: pd.DataFrame) -> pd.DataFrame:
@@ -30,15 +34,49 @@ def runtimes(movies: pd.DataFrame) -> pd.DataFrame:
     return runtimes
 
 
-def country_split(df: pd.DataFrame, feature) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame,
-                                                      pd.DataFrame]:
+def group_split(
+    df: pd.DataFrame,
+    by: Union[str, List[str]],
+    feature=None,
+    keys: Optional[Sequence] = None,
+) -> Dict:
     """
-    Split the dataframe into 5 different dataframes, one for each country.
+    Split the dataframe into one dataframe per group of the given column(s), e.g. one
+    per country or per (country, decade), in a single pass: the rows are sorted by group
+    once, and each group is a slice of the sorted rows.
+    Only the feature column(s) are kept if given. The groups are returned in the order
+    of keys if given (with an empty dataframe for missing groups), sorted otherwise.
     """
-    df_fr = df[df.Movie_Countries == 'France'][feature]
-    df_jp = df[df.Movie_Countries == 'Japan'][feature]
-    df_in = df[df.Movie_Countries == 'India'][feature]
-    df_uk = df[df.Movie_Countries == 'United Kingdom'][feature]
-    df_us = df[df.Movie_Countries == 'United States of America'][feature]
+    columns = [by] if isinstance(by, str) else list(by)
+    codes, groups = aggregate.group_codes(df, columns)
+    # Rows with a missing key are left out, as by groupby
+    order = np.argsort(codes, kind="stable")
+    order = order[codes[order] >= 0]
+    bounds = np.searchsorted(codes[order], np.arange(len(groups) + 1))
+    values = (df if feature is None else df[feature]).iloc[order]
 
-    return df_fr, df_jp, df_in, df_uk, df_us
+    labels = groups[columns[0]] if isinstance(by, str) else pd.MultiIndex.from_frame(groups)
+    split = {
+        label: values.iloc[bounds[i] : bounds[i + 1]] for i, label in enumerate(labels)
+    }
+    if keys is None:
+        return split
+    return {key: split.get(key, values.iloc[:0]) for key in keys}
+
+
+def country_split(
+    df: pd.DataFrame,
+    feature,
+    countries: Sequence[str] = (
+        "France",
+        "Japan",
+        "India",
+        "United Kingdom",
+        "United States of America",
+    ),
+) -> Tuple[pd.DataFrame, ...]:
+    """
+    Split the dataframe into one dataframe per country, in the order of countries
+    (by default France, Japan, India, United Kingdom and United States of America).
+    """
+    return tuple(group_split(df, "Movie_Countries", feature, countries).values())
@@ -0,0 +1,258 @@
+import functools
+import importlib
+import inspect
+import json
+import os
+import threading
+import time
+import pandas as pd
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows: the peak memory is not recorded
+    resource = None
+
+# Modules whose public functions are instrumented by default
+MODULES = ["load", "clean", "aggregate", "features", "nlp_modules"]
+
+# Original functions replaced by enable, by (module, name)
+_ORIGINALS: Dict[Tuple[str, str], Callable] = {}
+# Calls recorded since the last reset, and the depth of the current call
+_RECORDS: List[Dict] = []
+_LOCAL = threading.local()
+
+
+def _module(name: str):
+    # Modules of the package, or of the src directory when imported from it
+    if __package__:
+        return importlib.import_module(f".{name}", __package__)
+    return importlib.import_module(name)
+
+
+def _peak_rss_mb() -> float:
+    if resource is None:
+        return float("nan")
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _size(value) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Number of rows and bytes of a DataFrame, Series or array (shallow size, as a deep
+    size would scan every string), number of items of other sized values.
+    """
+    if isinstance(value, pd.DataFrame):
+        return len(value), int(value.memory_usage(index=True).sum())
+    if isinstance(value, pd.Series):
+        return len(value), int(value.memory_usage(index=True))
+    if hasattr(value, "nbytes") and hasattr(value, "__len__"):
+        return len(value), int(value.nbytes)
+    if isinstance(value, (list, tuple, dict)):
+        sizes = [_size(v) for v in value] if isinstance(value, tuple) else []
+        if sizes and all(rows is not None for rows, _ in sizes):
+            # Tuples of DataFrames, e.g. country_split
+            return sum(r for r, _ in sizes), sum(b or 0 for _, b in sizes)
+        return len(value), None
+    return None, None
+
+
+def _input_size(args: tuple, kwargs: dict) -> Tuple[Optional[int], Optional[int]]:
+    rows = nbytes = None
+    for value in list(args) + list(kwargs.values()):
+        value_rows, value_bytes = _size(value)
+        if value_rows is not None and isinstance(value, (pd.DataFrame, pd.Series)):
+            rows = (rows or 0) + value_rows
+            nbytes = (nbytes or 0) + (value_bytes or 0)
+    return rows, nbytes
+
+
+@contextmanager
+def stage(name: str, inputs: tuple = (), category: str = "stage"):
+    """
+    Records the time and memory of a block of code, e.g. the encoding of sentences.
+    Yields the record of the block, which is added to the report when the block exits:
+    the output size is not known, and is only recorded if set in the record.
+    """
+    depth = getattr(_LOCAL, "depth", 0)
+    _LOCAL.depth = depth + 1
+    rows_in, bytes_in = _input_size(inputs, {})
+    record = {
+        "function": name,
+        "category": category,
+        "depth": depth,
+        "thread": threading.get_ident(),
+        "start": None,
+        "wall": None,
+        "cpu": None,
+        "peak_rss_delta_mb": None,
+        "rows_in": rows_in,
+        "bytes_in": bytes_in,
+        "rows_out": None,
+        "bytes_out": None,
+    }
+    rss = _peak_rss_mb()
+    cpu = time.process_time()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        end = time.perf_counter()
+        _LOCAL.depth = depth
+        record.update(
+            start=start,
+            wall=end - start,
+            cpu=time.process_time() - cpu,
+            peak_rss_delta_mb=_peak_rss_mb() - rss,
+        )
+        _RECORDS.append(record)
+
+
+def traced(func: Callable, name: Optional[str] = None) -> Callable:
+    """
+    Wraps a function such that each call is recorded, with the sizes of its DataFrame
+    inputs and of its output.
+    """
+    name = name or f"{func.__module__}.{func.__name__}"
+    category = func.__module__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with stage(name, tuple(args) + tuple(kwargs.values()), category) as record:
+            result = func(*args, **kwargs)
+        # The record of this call, as other calls may have been recorded meanwhile
+        record["rows_out"], record["bytes_out"] = _size(result)
+        return result
+
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+def public_functions(module) -> List[str]:
+    """
+    Returns the names of the public functions defined in the given module.
+    """
+    return [
+        name
+        for name, value in vars(module).items()
+        if inspect.isfunction(value)
+        and value.__module__ == module.__name__
+        and not name.startswith("_")
+    ]
+
+
+def enable(modules: Sequence[str] = MODULES):
+    """
+    Replaces the public functions of the given modules by traced versions. Calls
+    through the module (e.g. clean.explode_dict, also from other modules) are
+    recorded, but not functions imported by name before enabling.
+    Nothing is replaced while disabled, so that the functions run without overhead.
+    """
+    for module_name in modules:
+        module = _module(module_name)
+        for name in public_functions(module):
+            if (module_name, name) not in _ORIGINALS:
+                _ORIGINALS[(module_name, name)] = getattr(module, name)
+                setattr(module, name, traced(getattr(module, name)))
+
+
+def disable():
+    """
+    Restores the original functions.
+    """
+    for (module_name, name), func in _ORIGINALS.items():
+        setattr(_module(module_name), name, func)
+    _ORIGINALS.clear()
+
+
+def reset():
+    """
+    Removes the recorded calls.
+    """
+    _RECORDS.clear()
+
+
+def report() -> pd.DataFrame:
+    """
+    Returns one row per recorded call, in order of start, with the wall and CPU times
+    in seconds, the increase of the peak resident memory of the process in MB, and the
+    number of rows and bytes of the inputs and output.
+    Nested calls (e.g. explode_dict within movie_metadata) have a larger depth and are
+    included in the time of their caller.
+    """
+    df = pd.DataFrame(_RECORDS)
+    if len(df):
+        df = df.sort_values("start", kind="stable").reset_index(drop=True)
+        df["start"] -= df.start.min()
+    return df
+
+
+def summary() -> pd.DataFrame:
+    """
+    Returns the number of calls, total and maximum wall time, total CPU time and
+    maximum peak memory increase of each function, slowest first.
+    """
+    df = report()
+    if len(df) == 0:
+        return df
+    return (
+        df.groupby("function")
+        .agg(
+            calls=("wall", "size"),
+            wall=("wall", "sum"),
+            max_wall=("wall", "max"),
+            cpu=("cpu", "sum"),
+            peak_rss_delta_mb=("peak_rss_delta_mb", "max"),
+            rows_in=("rows_in", "sum"),
+            rows_out=("rows_out", "sum"),
+        )
+        .sort_values("wall", ascending=False)
+    )
+
+
+def chrome_trace(path: str):
+    """
+    Writes the recorded calls in the Chrome trace event format, which can be opened
+    in chrome://tracing or https://ui.perfetto.dev.
+    """
+    events = [
+        {
+            "name": record["function"],
+            "cat": record["category"],
+            "ph": "X",
+            "ts": record["start"] * 1e6,
+            "dur": record["wall"] * 1e6,
+            "pid": os.getpid(),
+            "tid": record["thread"],
+            "args": {
+                key: record[key]
+                for key in ["cpu", "peak_rss_delta_mb", "rows_in", "bytes_in", "rows_out", "bytes_out"]
+                if record[key] is not None
+            },
+        }
+        for record in _RECORDS
+    ]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+@contextmanager
+def profile(modules: Sequence[str] = MODULES, trace: Optional[str] = None):
+    """
+    Records the calls of the public functions of the given modules within the block,
+    and writes them to a Chrome trace file if given, e.g.
+
+        with instrument.profile(trace="trace.json"):
+            movies = load.movie_metadata()
+        instrument.summary()
+    """
+    reset()
+    enable(modules)
+    try:
+        yield
+    finally:
+        disable()
+        if trace is not None:
+            chrome_trace(trace)
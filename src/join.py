@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+# Key of the movie dimension
+KEY = "Wikipedia_Movie_ID"
+# Columns with several values per movie, i.e. one row per value in the exploded movie metadata
+MULTI_VALUED = ["Movie_Languages", "Movie_Countries", "Movie_Genres"]
+
+
+class MovieDimension:
+    """
+    Movie attributes indexed by Wikipedia_Movie_ID, to align characters and summaries
+    with their movie without a merge. The index of the movie IDs is built once, and
+    aligning a table gathers the requested columns by position: the keys of the table
+    are looked up in the index, and the lookup can be reused for several alignments.
+    Single-valued columns are stored with one row per movie. Multi-valued columns
+    (languages, countries, genres) are stored as the distinct values of each movie,
+    sorted by movie, with the offset of the first value of each movie.
+    """
+
+    def __init__(
+        self, movies: pd.DataFrame, links: Optional[Dict[str, pd.DataFrame]] = None
+    ):
+        """
+        Builds the dimension from a movie DataFrame, which can have one row per movie
+        or be exploded (as load.movie_metadata and the D1 dataset). Multi-valued columns
+        can also be given as link tables with one row per (movie, value) pair, as
+        returned by load.movie_tables.
+        """
+        codes, ids = pd.factorize(movies[KEY])
+        self.index = pd.Index(ids)
+        # First row of each movie, in order of first appearance
+        first = np.full(len(ids), len(codes), dtype=np.int64)
+        np.minimum.at(first, codes[codes >= 0], np.flatnonzero(codes >= 0))
+        links = dict(links or {})
+        for column in MULTI_VALUED:
+            if column in movies.columns and column not in links:
+                links[column] = movies[[KEY, column]]
+        single = [c for c in movies.columns if c != KEY and c not in links]
+        self.columns = movies[single].take(first).reset_index(drop=True)
+        self.links = {column: self._link(link, column) for column, link in links.items()}
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _link(
+        self, link: pd.DataFrame, column: str
+    ) -> Tuple[np.ndarray, np.ndarray, pd.Index, bool]:
+        positions = self.index.get_indexer(link[KEY])
+        values = link[column]
+        categorical = isinstance(values.dtype, pd.CategoricalDtype)
+        if categorical:
+            value_codes, categories = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            value_codes, categories = pd.factorize(values)
+        valid = (positions >= 0) & (value_codes >= 0)
+        positions, value_codes = positions[valid], value_codes[valid]
+        # Distinct values of each movie, in order of first appearance
+        _, first = np.unique(
+            positions.astype(np.int64) * max(len(categories), 1) + value_codes,
+            return_index=True,
+        )
+        first = first[np.lexsort((first, positions[first]))]
+        counts = np.bincount(positions[first], minlength=len(self.index))
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        return offsets, value_codes[first], categories, categorical
+
+    def positions(self, keys: Union[pd.Series, np.ndarray]) -> np.ndarray:
+        """
+        Returns the position of the movie of each key, -1 for unknown movies.
+        """
+        return self.index.get_indexer(keys)
+
+    def gather(
+        self,
+        keys: Union[pd.Series, np.ndarray],
+        columns: Sequence[str],
+        how: str = "inner",
+        positions: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, pd.DataFrame]:
+        """
+        Gathers the given columns for the movie of each key. Only these columns are
+        materialized. Returns the row of the keys of each output row and the columns.
+        With a multi-valued column, there is one output row per value of the movie.
+        Keys without movie are dropped with how="inner", and have missing values with
+        how="left" (integer and boolean columns then have a nullable type, e.g. Int16). At most one multi-valued column can be given,
+        as several would give the cross product of their values.
+        """
+        if positions is None:
+            positions = self.positions(keys)
+        multi = [c for c in columns if c in self.links]
+        if len(multi) > 1:
+            raise ValueError(f"Only one multi-valued column can be gathered at once, got {multi}")
+        rows = np.arange(len(positions))
+        if how == "inner":
+            rows = rows[positions >= 0]
+        elif how != "left":
+            raise ValueError(f"Unknown join type: {how}")
+        gathered = {}
+        if multi:
+            offsets, codes, categories, categorical = self.links[multi[0]]
+            movie = positions[rows]
+            counts = np.where(movie >= 0, offsets[movie + 1] - offsets[movie], 0)
+            # Movies without value have a single row, with a missing value
+            repeats = np.maximum(counts, 1)
+            within = np.arange(repeats.sum()) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+            found = within < np.repeat(counts, repeats)
+            value_codes = np.full(len(within), -1, dtype=np.int64)
+            value_codes[found] = codes[np.repeat(offsets[movie], repeats)[found] + within[found]]
+            values = pd.Categorical.from_codes(value_codes, categories)
+            gathered[multi[0]] = values if categorical else np.asarray(values)
+            rows = np.repeat(rows, repeats)
+        movie = positions[rows]
+        missing = (movie < 0).any()
+        for column in columns:
+            if column not in gathered:
+                values = self.columns[column].array
+                if missing and values.dtype.kind in "iub":
+                    # Nullable type, such that the missing values do not turn integers
+                    # (e.g. years and decades) into floats
+                    values = pd.array(values.to_numpy())
+                gathered[column] = pd.api.extensions.take(values, movie, allow_fill=True)
+        return rows, pd.DataFrame({column: gathered[column] for column in columns})
+
+    def align(
+        self,
+        df: pd.DataFrame,
+        columns: Sequence[str],
+        how: str = "inner",
+        positions: Optional[np.ndarray] = None,
+    ) -> pd.DataFrame:
+        """
+        Adds the given columns of the movie of each row to the DataFrame, as a merge on
+        Wikipedia_Movie_ID with the movie table would, keeping the order of the rows.
+        The positions of the movies of the rows can be given to reuse a lookup.
+        """
+        rows, gathered = self.gather(df[KEY], columns, how, positions)
+        result = df.take(rows).reset_index(drop=True)
+        for column in columns:
+            result[column] = gathered[column].array
+        return result
+
+
+def movie_dimension(movies: Union[pd.DataFrame, MovieDimension]) -> MovieDimension:
+    """
+    Returns the given movie dimension, or builds it from a movie DataFrame.
+    """
+    if isinstance(movies, MovieDimension):
+        return movies
+    return MovieDimension(movies)
+
+
+def merge_indexers(
+    left_keys: Union[pd.Series, np.ndarray], right_keys: Union[pd.Series, np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the left and right row of each row of the inner merge of two key columns.
+    Only the keys and the row numbers are merged, such that the rows and their order
+    are the ones of pd.merge (which depend on the version of pandas) without copying
+    the other columns through the merge.
+    """
+    left = pd.DataFrame({KEY: pd.Series(left_keys).array, "left": np.arange(len(left_keys))})
+    right = pd.DataFrame({KEY: pd.Series(right_keys).array, "right": np.arange(len(right_keys))})
+    merged = left.merge(right, on=KEY)
+    return merged["left"].to_numpy(), merged["right"].to_numpy()
+
+
+def merge(left: pd.DataFrame, right: pd.DataFrame, columns: Sequence[str]) -> pd.DataFrame:
+    """
+    Adds the given columns of right to left, with the same rows, order and types as
+    left.merge(right[[KEY] + columns], on=KEY), e.g. one row per exploded movie row.
+    Only the key column and the given columns of right are read.
+    """
+    left_rows, right_rows = merge_indexers(left[KEY], right[KEY])
+    result = left.take(left_rows).reset_index(drop=True)
+    for column in columns:
+        result[column] = right[column].take(right_rows).array
+    return result
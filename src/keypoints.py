@@ -0,0 +1,151 @@
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from typing import List, Optional, Tuple
+if __package__:
+    from . import nlp_modules
+else:
+    import nlp_modules
+
+# Output of the key point extraction over all plot summaries
+KEYPOINTS_FILE = "../data/keypoints.parquet"
+
+# Sentence boundary: end punctuation followed by whitespace and an upper case letter or quote
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[\"'A-Z])")
+
+
+def split_sentences(summary: str) -> List[str]:
+    """
+    Splits a plot summary into sentences.
+    """
+    return [s for s in SENTENCE_END.split(summary.strip()) if s]
+
+
+def candidates(summary: str, min_len: int = 5, max_len: int = 35) -> List[str]:
+    """
+    Returns the sentences of a summary that are candidate key points, with the same
+    length bounds as nlp_modules.apply_page_rank.
+    """
+    return [
+        s for s in split_sentences(summary) if min_len < len(s.split()) < max_len
+    ]
+
+
+def movie_keypoints(
+    sentences: List[str],
+    embeddings: np.ndarray,
+    p: float = 0.85,
+    min_match_score: float = 0.5,
+    min_match: float = 0.8,
+    N: int = 3,
+) -> Tuple[List[str], List[float]]:
+    """
+    Ranks the candidate sentences of one summary with PageRank and filters the ranked
+    list, as apply_page_rank followed by filter_ranked_list, but from precomputed
+    embeddings. Returns the key points and their PageRank scores.
+    """
+    if len(sentences) == 0:
+        return [], []
+    embeddings = nlp_modules.normalize_rows(embeddings)
+    sim_matrix = embeddings @ embeddings.T
+    sim_matrix[sim_matrix < min_match_score] = 0
+    scores = nlp_modules.pagerank(sim_matrix, p=p)
+    ranked = np.argsort(-scores, kind="stable")
+    selected = ranked[
+        nlp_modules.select_diverse(embeddings[ranked], min_match=min_match, N=N)
+    ]
+    return [sentences[i] for i in selected], [float(scores[i]) for i in selected]
+
+
+def _movie_keypoints(task):
+    movie_id, sentences, embeddings, params = task
+    keypoints, scores = movie_keypoints(sentences, embeddings, **params)
+    return movie_id, keypoints, scores
+
+
+def _checkpoints(output: str) -> List[str]:
+    return sorted(glob(f"{output}.parts/part-*.parquet"))
+
+
+def _write(df: pd.DataFrame, path: str):
+    # Written to a temporary path first, as cache.write, such that an interrupted
+    # write never leaves a truncated part behind
+    tmp = f"{path}.{os.getpid()}.tmp"
+    df.to_parquet(tmp)
+    os.replace(tmp, path)
+
+
+def run(
+    summaries: pd.DataFrame,
+    model,
+    output: str = KEYPOINTS_FILE,
+    jobs: Optional[int] = None,
+    chunk_size: int = 1000,
+    batch_size: int = 256,
+    min_len: int = 5,
+    max_len: int = 35,
+    **params,
+) -> pd.DataFrame:
+    """
+    Extracts the key points of all plot summaries (as returned by load.plot_summaries).
+    For each chunk of summaries, the candidate sentences of all summaries are encoded
+    at once by the model (or an embeddings.EmbeddingStore), then PageRank and the
+    filtering run in a pool of jobs processes. Each chunk is checkpointed to disk, such
+    that an interrupted run resumes where it stopped.
+    The remaining parameters are passed to movie_keypoints.
+    Writes one row per movie, with its key points and their scores, to the output
+    Parquet file and returns it.
+    """
+    os.makedirs(f"{output}.parts", exist_ok=True)
+    for tmp in glob(f"{output}.parts/*.tmp"):
+        os.remove(tmp)
+    parts = _checkpoints(output)
+    done = (
+        pd.read_parquet(parts, columns=["Wikipedia_Movie_ID"]).Wikipedia_Movie_ID
+        if parts
+        else pd.Series([], dtype=int)
+    )
+    todo = summaries[~summaries.Wikipedia_Movie_ID.isin(done)]
+    print(f"{len(done):,} summaries already processed, {len(todo):,} to go")
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(jobs) as pool:
+        for i, first in enumerate(range(0, len(todo), chunk_size)):
+            chunk = todo.iloc[first : first + chunk_size]
+            sentences = [candidates(s, min_len, max_len) for s in chunk.Summary]
+            flat = [s for movie in sentences for s in movie]
+            embeddings = (
+                np.asarray(model.encode(flat, batch_size=batch_size), dtype=np.float32)
+                if flat
+                else np.zeros((0, 0), dtype=np.float32)
+            )
+            bounds = np.cumsum([0] + [len(movie) for movie in sentences])
+            tasks = [
+                (movie_id, movie, embeddings[lo:hi], params)
+                for movie_id, movie, lo, hi in zip(
+                    chunk.Wikipedia_Movie_ID, sentences, bounds[:-1], bounds[1:]
+                )
+            ]
+            results = pool.map(_movie_keypoints, tasks, chunksize=16)
+            part = pd.DataFrame(
+                results, columns=["Wikipedia_Movie_ID", "Keypoints", "Scores"]
+            )
+            _write(part, f"{output}.parts/part-{len(parts) + i:05d}.parquet")
+
+            processed = first + len(chunk)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{processed:,}/{len(todo):,} summaries "
+                f"({processed / elapsed:.1f} summaries/sec)"
+            )
+
+    parts = _checkpoints(output)
+    if not parts:
+        return pd.DataFrame(columns=["Wikipedia_Movie_ID", "Keypoints", "Scores"])
+    result = pd.read_parquet(parts)
+    _write(result, output)
+    return result
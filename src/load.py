@@ -1,7 +1,11 @@
 import numpy as np
 import pandas as pd
-import clean
-from typing import Tuple
+from typing import Iterator, List, Optional, Tuple, Union
+if __package__:
+    from . import cache, clean
+else:
+    import cache
+    import clean
 
 # Data directories
 DATA_DIR = "../data"
@@ -46,40 +50,90 @@ NAME_CLUSTERS_COLS = ["Character_Name", "Freebase_Char_Actor_Map_ID"]
 PLOT_SUM_COLS = ["Wikipedia_Movie_ID", "Summary"]
 TVTROPES_COLS = ["Character_Type", "Character_Description"]
 
+# Column types used for chunked loading
+CHARACTER_META_DTYPES = {
+    "Wikipedia_Movie_ID": "int32",
+    "Freebase_Movie_ID": "object",
+    "Movie_Release_Date": "object",
+    "Character_Name": "object",
+    "Actor_DOB": "object",
+    "Actor_Gender": pd.CategoricalDtype(["F", "M"]),
+    "Actor_Height": "float32",
+    "Actor_Ethnicity": "category",
+    "Actor_Name": "object",
+    "Actor_Age_at_Movie_Release": "float32",
+    "Freebase_Char_Actor_Map_ID": "object",
+    "Freebase_Char_ID": "object",
+    "Freebase_Actor_ID": "object",
+}
+PLOT_SUM_DTYPES = {"Wikipedia_Movie_ID": "int32", "Summary": "object"}
 
-def character_metadata() -> pd.DataFrame:
+# Movie industries of the analysis, and their short names in the regression frames
+COUNTRIES = ["France", "India", "Japan", "United Kingdom", "United States of America"]
+SHORT_NAMES = {"United Kingdom": "UK", "United States of America": "US"}
+# Decades of the analysis, i.e. of each country in the regression frames of the notebook
+DECADES = [1950, 1960, 1970, 1980, 1990, 2000, 2010]
+
+# Number of rows sampled to estimate the memory footprint of a row
+SAMPLE_ROWS = 1000
+# Factor accounting for the intermediate copies made while cleaning a chunk
+CLEANING_OVERHEAD = 4
+
+
+def character_metadata(columns: Optional[List[str]] = None) -> pd.DataFrame:
     """
     Loads the character metadata file into a DataFrame.
-    It stores it into a pickle for faster subsequent loading.
+    It stores it in the Parquet cache for faster subsequent loading. The cache
+    is rebuilt whenever the source file changes.
+    Only the given columns are loaded (all columns by default).
     """
-    pickle = "./df_character_raw.pickle"
-    try:
-        return pd.read_pickle(pickle)
-    except:
-        df = pd.read_csv(CHARACTER_META_FILE, sep="\t", names=CHARACTER_META_COLS)
-        pd.to_pickle(df, pickle)
-        return df
+    return cache.cached(
+        "character_raw",
+        lambda: pd.read_csv(CHARACTER_META_FILE, sep="\t", names=CHARACTER_META_COLS),
+        columns=columns,
+        sources=[CHARACTER_META_FILE],
+    )
 
 
-def movie_metadata() -> pd.DataFrame:
+def movie_metadata(columns: Optional[List[str]] = None) -> pd.DataFrame:
     """
     Loads the movie metadata file into a DataFrame.
     It explodes the movie languages, countries, and genres into multiple
     rows, such that each column contains a single value rather than a dictionary
     of values.
-    It stores it into a pickle for faster subsequent loading.
+    It stores it in the Parquet cache for faster subsequent loading. The cache
+    is rebuilt whenever the source file changes.
+    Only the given columns are loaded (all columns by default).
     """
-    pickle = "./df_movies_raw.pickle"
-    try:
-        return pd.read_pickle(pickle)
-    except:
+
+    def build() -> pd.DataFrame:
         df = pd.read_csv(MOVIE_META_FILE, sep="\t", names=MOVIE_META_COLS)
         # Explode dictionaries into separate rows
         df = clean.explode_dict(df, "Movie_Languages")
         df = clean.explode_dict(df, "Movie_Countries")
-        df = clean.explode_dict(df, "Movie_Genres")
-        pd.to_pickle(df, pickle)
-        return df
+        return clean.explode_dict(df, "Movie_Genres")
+
+    return cache.cached(
+        "movies_raw", build, columns=columns, sources=[MOVIE_META_FILE]
+    )
+
+
+def movie_tables() -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Loads the movie metadata file into a normalized set of DataFrames: one row per
+    movie, and one link table each for movie languages, countries and genres.
+    This is much faster and lighter than movie_metadata, which explodes the
+    languages, countries, and genres into their cross product.
+    The tables are stored in the Parquet cache for faster subsequent loading.
+    """
+    names = ["movies", "movie_languages", "movie_countries", "movie_genres"]
+    tables = [cache.read(name, cache.cache_key([MOVIE_META_FILE])) for name in names]
+    if any(table is None for table in tables):
+        df = pd.read_csv(MOVIE_META_FILE, sep="\t", names=MOVIE_META_COLS)
+        tables = clean.normalize_movies(df)
+        for name, table in zip(names, tables):
+            cache.write(name, cache.cache_key([MOVIE_META_FILE]), table)
+    return tuple(tables)
 
 
 def name_clusters() -> pd.DataFrame:
@@ -97,6 +151,122 @@ def plot_summaries() -> pd.DataFrame:
     return pd.read_csv(PLOT_SUM, sep="\t", names=PLOT_SUM_COLS)
 
 
+def chunk_size(path: str, names: List[str], dtypes: dict, max_memory_mb: float) -> int:
+    """
+    Returns the number of rows per chunk such that loading and cleaning a chunk
+    stays within the given memory budget. The memory footprint of a row is
+    estimated on the first rows of the file.
+    """
+    sample = pd.read_csv(path, sep="\t", names=names, dtype=dtypes, nrows=SAMPLE_ROWS)
+    row_bytes = sample.memory_usage(deep=True).sum() / max(len(sample), 1)
+    return max(int(max_memory_mb * 2**20 / (row_bytes * CLEANING_OVERHEAD)), 1)
+
+
+def character_chunks(max_memory_mb: float = 256) -> Iterator[pd.DataFrame]:
+    """
+    Loads the character metadata file in typed chunks that each fit in the given
+    memory budget. Genders and ethnicities are categorical, numbers are downcast.
+    """
+    size = chunk_size(
+        CHARACTER_META_FILE, CHARACTER_META_COLS, CHARACTER_META_DTYPES, max_memory_mb
+    )
+    yield from pd.read_csv(
+        CHARACTER_META_FILE,
+        sep="\t",
+        names=CHARACTER_META_COLS,
+        dtype=CHARACTER_META_DTYPES,
+        chunksize=size,
+    )
+
+
+def plot_summary_chunks(max_memory_mb: float = 256) -> Iterator[pd.DataFrame]:
+    """
+    Loads the plot summaries in typed chunks that each fit in the given memory budget.
+    """
+    size = chunk_size(PLOT_SUM, PLOT_SUM_COLS, PLOT_SUM_DTYPES, max_memory_mb)
+    yield from pd.read_csv(
+        PLOT_SUM, sep="\t", names=PLOT_SUM_COLS, dtype=PLOT_SUM_DTYPES, chunksize=size
+    )
+
+
+def concat_chunks(chunks: Iterator[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenates chunks into a single DataFrame. Categorical columns are merged
+    into the union of their categories instead of falling back to strings.
+    """
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame()
+    categorical = [
+        column
+        for column, dtype in chunks[0].dtypes.items()
+        if isinstance(dtype, pd.CategoricalDtype)
+    ]
+    merged = {
+        column: pd.api.types.union_categoricals([chunk[column] for chunk in chunks])
+        for column in categorical
+    }
+    df = pd.concat(
+        [chunk.drop(columns=categorical) for chunk in chunks], ignore_index=True
+    )
+    for column, values in merged.items():
+        df[column] = values
+    return df[chunks[0].columns]
+
+
+def character_pipeline(
+    min_year: int,
+    max_year: int,
+    positive_ages: bool = False,
+    max_memory_mb: float = 256,
+    output: Optional[str] = None,
+) -> Optional[pd.DataFrame]:
+    """
+    Loads and cleans the character metadata chunk by chunk, within the given
+    memory budget. Each chunk goes through drop_undefined_actors, parse_dates,
+    keep_dates and, if positive_ages is set, positive_age.
+    If an output path is given, the cleaned chunks are appended to that Parquet
+    file and nothing is returned, such that the full table never has to be in
+    memory. Otherwise the cleaned chunks are concatenated and returned.
+    """
+
+    def cleaned() -> Iterator[pd.DataFrame]:
+        for chunk in character_chunks(max_memory_mb):
+            chunk = clean.drop_undefined_actors(chunk)
+            chunk = clean.parse_dates(chunk, "Movie_Release_Date")
+            chunk = clean.keep_dates(chunk, min_year, max_year)
+            if positive_ages:
+                chunk = clean.positive_age(chunk)
+            yield chunk
+
+    if output is None:
+        return concat_chunks(cleaned())
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Categories differ between chunks, so they are stored as plain strings
+    types = {"int32": pa.int32(), "float32": pa.float32()}
+    schema = pa.schema(
+        [
+            (column, types.get(str(dtype), pa.string()))
+            for column, dtype in CHARACTER_META_DTYPES.items()
+        ]
+    ).set(
+        CHARACTER_META_COLS.index("Movie_Release_Date"),
+        pa.field("Movie_Release_Date", pa.timestamp("ns")),
+    )
+    with pq.ParquetWriter(output, schema) as writer:
+        for chunk in cleaned():
+            writer.write_table(
+                pa.Table.from_pandas(
+                    chunk.astype({"Actor_Gender": "object", "Actor_Ethnicity": "object"}),
+                    schema=schema,
+                    preserve_index=False,
+                )
+            )
+
+
 def character_types() -> pd.DataFrame:
     """
     Loads the character types file into a DataFrame.
@@ -117,7 +287,7 @@ def gender_ratio(df: pd.DataFrame) -> pd.DataFrame:
     """
     Calculate gender ratio (female / male) and save results in new dataframe.
     """
-    grouped_gender = df.groupby(['decade', 'Movie_Countries'])
+    grouped_gender = df.groupby(['decade', 'Movie_Countries'], observed=True)
     gr = grouped_gender['Actor_Gender_F'].sum().div(grouped_gender['Actor_Gender_M'].sum())
     return pd.DataFrame(gr, columns=['Ratio F/M'])
 
@@ -136,57 +306,78 @@ def ethnicity_ratio(df: pd.DataFrame) -> pd.DataFrame:
     """
     Returns the ratio of number of unique ethnicities / number of actors (with data about their ethnicity).
     """
-    return df.groupby(['Movie_Countries', 'decade']).Actor_Ethnicity.nunique().div(
-        df.groupby(['Movie_Countries', 'decade']).Actor_Ethnicity.count())
+    ethnicities = df.groupby(['Movie_Countries', 'decade'], observed=True).Actor_Ethnicity
+    return ethnicities.nunique().div(ethnicities.count())
 
 
 def top_n_ethnic(df: pd.DataFrame, n: int) -> pd.DataFrame:
     """
     Returns the top n ethnic groups.
     """
-    top_ethn = df.groupby('Movie_Countries').Actor_Ethnicity.value_counts()
-    top_ethn = top_ethn.groupby('Movie_Countries').nlargest(n).to_frame().droplevel(0)
+    top_ethn = df.groupby('Movie_Countries', observed=True).Actor_Ethnicity.value_counts()
+    top_ethn = top_ethn.groupby('Movie_Countries', observed=True).nlargest(n).to_frame().droplevel(0)
     return top_ethn.rename(columns={'Actor_Ethnicity': 'Count'})
 
 
-def std_full(df: pd.DataFrame) -> pd.DataFrame:
+def regression_frame(
+    values: Union[pd.Series, pd.DataFrame], name: str, sort: bool = True
+) -> pd.DataFrame:
+    """
+    Create a proper dataframe to apply linear regression from a series (or a dataframe with
+    a single column), with short country names.
+    A series indexed by country and decade (in any order of the levels, e.g. a groupby
+    result) gives one row per country and decade, sorted by country then decade if sort
+    is set. Otherwise the values are taken in order, one per decade of DECADES for each
+    country of COUNTRIES.
+    """
+    if isinstance(values, pd.DataFrame):
+        values = values.iloc[:, 0]
+    if {"Movie_Countries", "decade"} <= set(values.index.names):
+        frame = values.rename(name).reset_index()
+        if sort:
+            frame = frame.sort_values(["Movie_Countries", "decade"], kind="stable")
+    else:
+        frame = pd.DataFrame(
+            {
+                name: values.to_numpy(),
+                "decade": DECADES * len(COUNTRIES),
+                "Movie_Countries": np.repeat(COUNTRIES, len(DECADES)),
+            }
+        )
+    frame["countries"] = frame.Movie_Countries.replace(SHORT_NAMES)
+    return frame[[name, "decade", "countries"]].reset_index(drop=True)
+
+
+def std_full(df: Union[pd.Series, pd.DataFrame]) -> pd.DataFrame:
     """
-    Create a proper dataframe to apply linear regression.
+    Create a proper dataframe to apply linear regression on the standard deviations
+    grouped by country and decade, see regression_frame.
     """
-    age_diversity = pd.DataFrame(df.values, columns=['std'])
-    decades = [1950, 1960, 1970, 1980, 1990, 2000, 2010,
-               1950, 1960, 1970, 1980, 1990, 2000, 2010,
-               1950, 1960, 1970, 1980, 1990, 2000, 2010,
-               1950, 1960, 1970, 1980, 1990, 2000, 2010,
-               1950, 1960, 1970, 1980, 1990, 2000, 2010]
-    countries = ['France', 'France', 'France', 'France', 'France', 'France', 'France',
-                 'India', 'India', 'India', 'India', 'India', 'India', 'India',
-                 'Japan', 'Japan', 'Japan', 'Japan', 'Japan', 'Japan', 'Japan',
-                 'UK', 'UK', 'UK', 'UK', 'UK', 'UK', 'UK',
-                 'US', 'US', 'US', 'US', 'US', 'US', 'US']
-    age_diversity['decade'] = decades
-    age_diversity['countries'] = countries
-    return age_diversity
+    return regression_frame(df, "std")
 
 
 def contingency_table(df: pd.DataFrame):
     """
-    Creates contingency table for chi-squared test.
-    """
-    observed_m = df.groupby('Movie_Countries').Actor_Gender_M.sum().to_numpy().reshape(1, -1)
-    observed_f = df.groupby('Movie_Countries').Actor_Gender_F.sum().to_numpy().reshape(1, -1)
-    observed = np.concatenate((observed_m, observed_f), axis=0)
-    return observed
-
-
-def diversity_full(div_fr: pd.DataFrame, div_in: pd.DataFrame, div_jp: pd.DataFrame,
-                   div_uk: pd.DataFrame, div_us: pd.DataFrame) -> pd.DataFrame:
-    countries = ['France', 'France', 'France', 'France', 'France', 'France', 'France',
-                 'India', 'India', 'India', 'India', 'India', 'India', 'India',
-                 'Japan', 'Japan', 'Japan', 'Japan', 'Japan', 'Japan', 'Japan',
-                 'UK', 'UK', 'UK', 'UK', 'UK', 'UK', 'UK',
-                 'US', 'US', 'US', 'US', 'US', 'US', 'US']
-    combined = pd.concat((div_fr, div_in, div_jp, div_uk, div_us))
-    total_div = pd.DataFrame(combined, columns=['diversity']).reset_index()
-    total_div['countries'] = countries
-    return total_div
+    Creates contingency table for chi-squared test, with one row for male and one for
+    female actors and one column per country. See stats.chi2_test.
+    """
+    observed = df.groupby('Movie_Countries', observed=True)[['Actor_Gender_M', 'Actor_Gender_F']].sum()
+    return observed.to_numpy().T
+
+
+def diversity_full(
+    *diversities: Union[pd.Series, pd.DataFrame], countries: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """
+    Create a proper dataframe to apply linear regression on the diversity, either from
+    one series per country indexed by decade, in the order of countries (by default
+    COUNTRIES), or from a single series indexed by country and decade.
+    """
+    if len(diversities) == 1 and "Movie_Countries" in diversities[0].index.names:
+        return regression_frame(diversities[0], "diversity")[["decade", "diversity", "countries"]]
+    diversities = [d.iloc[:, 0] if isinstance(d, pd.DataFrame) else d for d in diversities]
+    diversity = pd.concat(
+        diversities, keys=countries or COUNTRIES, names=["Movie_Countries", "decade"]
+    )
+    # In the order of the given series
+    return regression_frame(diversity, "diversity", sort=False)[["decade", "diversity", "countries"]]
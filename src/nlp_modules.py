@@ -1,16 +1,48 @@
-from sklearn.cluster import AgglomerativeClustering
-from sklearn.metrics.pairwise import cosine_similarity
-from scipy import sparse
-from sentence_transformers import SentenceTransformer, util
-from fast_pagerank import pagerank
+import importlib
 import numpy as np
-from transformers import logging
-logging.set_verbosity_error()
+
+# The NLP dependencies take seconds to import, and are only imported on first use:
+# names of the attributes of this module that are taken from them
+LAZY_ATTRIBUTES = {
+    "AgglomerativeClustering": "sklearn.cluster",
+    "cosine_similarity": "sklearn.metrics.pairwise",
+    "SentenceTransformer": "sentence_transformers",
+    "util": "sentence_transformers",
+}
+# Sentence transformers loaded by get_model, by name
+_MODELS = {}
+
+
+def __getattr__(name):
+    if name not in LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(LAZY_ATTRIBUTES[name]), name)
+    globals()[name] = value
+    return value
+
+
+def get_model(name="all-MiniLM-L6-v2"):
+    """Return the sentence transformer with the given name, loaded on first use and shared by later calls
+    the transformers warnings are silenced, as they were on import"""
+    if name not in _MODELS:
+        from sentence_transformers import SentenceTransformer
+        from transformers import logging
+        logging.set_verbosity_error()
+        _MODELS[name] = SentenceTransformer(name)
+    return _MODELS[name]
+
+
+def pagerank(matrix, p=0.85):
+    """PageRank scores of the nodes of a (dense or sparse) similarity matrix, with fast_pagerank"""
+    from fast_pagerank import pagerank as fast_pagerank
+    return fast_pagerank(matrix, p=p)
+
 
 def gen_match_matrix(model, sents, min_match_score=0):
     """Generate a matrix of sentence matches for a list of sentences"""
     sents1 = [x for x in sents]
     sents1_embeddings = model.encode(sents1)
+    from sklearn.metrics.pairwise import cosine_similarity
     sim_matrix = cosine_similarity(sents1_embeddings, sents1_embeddings)
     super_threshold_indices = sim_matrix < min_match_score
     sim_matrix[super_threshold_indices] = 0
@@ -18,33 +50,93 @@ def gen_match_matrix(model, sents, min_match_score=0):
     return sim_matrix
 
 
-def filter_ranked_list(ranked_sents, model, min_match=0.8, N=3):
-    """a ranked list of sentences is filtered by removing sentences that are too similar to other sentences in the list
-    N is the number of sentences to return"""
-    ranked_sents = [x[0] for x in ranked_sents]
-    filtered_sents = []
-    for i, s in enumerate(ranked_sents):
-        if len(filtered_sents) >= N or len(filtered_sents) >= len(ranked_sents):
+def normalize_rows(embeddings):
+    """Scale embeddings to unit norm, such that dot products are cosine similarities"""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.where(norms == 0, 1, norms)
+
+
+def select_diverse(embeddings, scores=None, min_match=0.8, N=3, mmr_lambda=None):
+    """Greedily select the indices of up to N rows of unit-norm embeddings, such that no two selected rows
+    have a similarity of min_match or more.
+    A running vector of the maximum similarity to the selected rows is updated after each selection.
+    By default candidates are taken in order, as in a ranked list. With mmr_lambda, the next row is the
+    one maximizing mmr_lambda * score - (1 - mmr_lambda) * max similarity (maximal marginal relevance),
+    where scores are scaled to [0, 1]"""
+    n = len(embeddings)
+    max_sim = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    if mmr_lambda is not None:
+        scores = np.asarray(scores, dtype=np.float32)
+        scores = scores / scores.max() if n and scores.max() > 0 else scores
+    selected = []
+    while len(selected) < N:
+        candidates = np.flatnonzero(available & (max_sim < min_match))
+        if len(candidates) == 0:
             break
-        if len(filtered_sents) == 0:
-            filtered_sents.append(s)
+        if mmr_lambda is None:
+            i = candidates[0]
         else:
-            matching_scores = gen_match_matrix(model, [s] + filtered_sents)
-            max_sim = np.max(matching_scores[0][1:])
-            # print(matching_scores)
-            if max_sim < min_match:
-                filtered_sents.append(s)
+            novelty = np.maximum(max_sim[candidates], 0)
+            i = candidates[np.argmax(mmr_lambda * scores[candidates] - (1 - mmr_lambda) * novelty)]
+        selected.append(i)
+        available[i] = False
+        max_sim = np.maximum(max_sim, embeddings @ embeddings[i])
+    return selected
 
-        # print(min_match)
 
-    return filtered_sents
+def filter_ranked_list(ranked_sents, model, min_match=0.8, N=3, mmr_lambda=None):
+    """a ranked list of sentences is filtered by removing sentences that are too similar to other sentences in the list
+    N is the number of sentences to return
+    all candidates are encoded once, see select_diverse for the selection and the optional MMR weighting"""
+    scores = [x[1] for x in ranked_sents]
+    ranked_sents = [x[0] for x in ranked_sents]
+    if len(ranked_sents) == 0:
+        return []
+    embeddings = normalize_rows(model.encode(ranked_sents))
+    selected = select_diverse(embeddings, scores, min_match=min_match, N=N, mmr_lambda=mmr_lambda)
+    return [ranked_sents[i] for i in selected]
+
+
+def sparse_match_graph(embeddings, min_match_score=0, top_k=None, block_size=256):
+    """Generate a sparse CSR matrix of sentence matches from sentence embeddings
+    similarities are computed by blocks of block_size rows, and only those of at least min_match_score are kept,
+    restricted to the top_k most similar sentences of each row if given
+    peak memory is proportional to block_size * n plus the number of kept edges, rather than n * n"""
+    from scipy import sparse
+    embeddings = normalize_rows(embeddings)
+    n = len(embeddings)
+    if n == 0:
+        return sparse.csr_matrix((0, 0))
+    rows, cols, values = [], [], []
+    for start in range(0, n, block_size):
+        sim = embeddings[start:start + block_size] @ embeddings.T
+        if top_k is not None and top_k < n:
+            idx = np.argpartition(-sim, top_k - 1, axis=1)[:, :top_k]
+            sim = np.take_along_axis(sim, idx, axis=1)
+        else:
+            idx = np.broadcast_to(np.arange(n), sim.shape)
+        keep = sim >= min_match_score
+        rows.append(np.nonzero(keep)[0] + start)
+        cols.append(idx[keep])
+        values.append(sim[keep])
+    graph = sparse.csr_matrix(
+        (np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))), shape=(n, n))
+    graph.eliminate_zeros()
+    return graph
 
 
-def apply_page_rank(sentences, model, p=0.85, min_match_score=0.5, min_len=5, max_len=35):
+def apply_page_rank(sentences, model, p=0.85, min_match_score=0.5, min_len=5, max_len=35,
+                    sparse_graph=False, top_k=None, block_size=256):
     """Apply page rank to a list of sentences
+    model: sentence transformer, or an embeddings.EmbeddingStore wrapping it to reuse embeddings across calls
     min_match_score: minimum similarity score for two sentences to be considered similar
     min_len: minimum length of a sentence
     max_len: maximum length of a sentence
+    sparse_graph: build a sparse graph by blocks (see sparse_match_graph) instead of a dense n x n matrix,
+    for large sets of sentences; implied by top_k
+    top_k: number of most similar sentences each sentence is linked to in the sparse graph
     returns a ranked list of sentences
     """
     cand_sents = [x for x in sentences if len(
@@ -54,8 +146,12 @@ def apply_page_rank(sentences, model, p=0.85, min_match_score=0.5, min_len=5, ma
         return []
     # print(cands)
     # print(cands_qualities)
-    cands_matching_mat = gen_match_matrix(
-        model, cand_sents, min_match_score=min_match_score)
+    if sparse_graph or top_k is not None:
+        cands_matching_mat = sparse_match_graph(
+            model.encode(cand_sents), min_match_score=min_match_score, top_k=top_k, block_size=block_size)
+    else:
+        cands_matching_mat = gen_match_matrix(
+            model, cand_sents, min_match_score=min_match_score)
     # it looks like modifying the initial probability doesn't help
     pr = pagerank(cands_matching_mat, p=p)
     # pr=pagerank(cands_matching_mat, p=p)
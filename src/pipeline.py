@@ -0,0 +1,303 @@
+import hashlib
+import inspect
+import os
+import sys
+import time
+import pandas as pd
+from types import ModuleType
+from typing import Callable, Dict, List, Optional, Sequence
+if __package__:
+    from . import cache, clean, join, load
+else:
+    import cache
+    import clean
+    import join
+    import load
+
+# Directory of the modules whose source code is part of the keys of the nodes
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Default parameters of the datasets
+COUNTRIES = load.COUNTRIES
+MIN_YEAR = 1950
+MAX_YEAR = 2019
+
+
+def source_modules(module: ModuleType) -> List[ModuleType]:
+    """
+    Returns the given module and the modules of the src directory that it uses,
+    directly or through other modules of the src directory.
+    """
+    found: Dict[str, ModuleType] = {}
+    todo = [module]
+    while todo:
+        module = todo.pop()
+        path = getattr(module, "__file__", None)
+        if path is None or os.path.dirname(os.path.abspath(path)) != SOURCE_DIR:
+            continue
+        if module.__name__ not in found:
+            found[module.__name__] = module
+            todo.extend(v for v in vars(module).values() if inspect.ismodule(v))
+    return list(found.values())
+
+
+def source_hash(func: Callable) -> str:
+    """
+    Returns a hash of the source code of a function and of the modules it uses, such
+    that editing a step or any of the clean, load, ... functions it calls invalidates
+    its cached results.
+    """
+    try:
+        code = inspect.getsource(func)
+    except (OSError, TypeError):
+        code = f"{func.__module__}.{func.__qualname__}"
+    digest = hashlib.blake2b(code.encode(), digest_size=8)
+    module = sys.modules.get(getattr(func, "__module__", None) or "")
+    if module is not None:
+        paths = sorted(os.path.abspath(m.__file__) for m in source_modules(module))
+        for path in paths:
+            digest.update(cache.file_fingerprint(path)["hash"].encode())
+    return digest.hexdigest()
+
+
+class Node:
+    """
+    A step of the pipeline: a function producing a DataFrame from the outputs of
+    its input nodes, the given source files and parameters.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[..., pd.DataFrame],
+        inputs: Sequence[str] = (),
+        sources: Sequence[str] = (),
+        persist: bool = True,
+        **params,
+    ):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.sources = list(sources)
+        self.persist = persist
+        self.params = params
+
+
+class Pipeline:
+    """
+    A DAG of nodes whose outputs are persisted in the cache, content-addressed by
+    the hash of their source files, input nodes, code (including the modules of the
+    src directory that it uses) and parameters. The entries of other parameters are
+    kept, and cache.prune removes the least recently used ones.
+    Running the pipeline only recomputes the nodes whose key changed, and loads
+    the others from the cache.
+    """
+
+    def __init__(self, verbose: bool = True):
+        self.nodes: Dict[str, Node] = {}
+        self.verbose = verbose
+        self.timings: List[Dict] = []
+        self._keys: Dict[str, str] = {}
+
+    def add(
+        self,
+        name: str,
+        func: Callable[..., pd.DataFrame],
+        inputs: Sequence[str] = (),
+        sources: Sequence[str] = (),
+        persist: bool = True,
+        **params,
+    ) -> "Pipeline":
+        """
+        Adds a node to the pipeline. Its inputs must already be part of the pipeline.
+        Nodes that cache their output themselves (such as the load functions) can
+        set persist to False.
+        """
+        missing = [i for i in inputs if i not in self.nodes]
+        if missing:
+            raise KeyError(f"Unknown inputs of node {name}: {missing}")
+        self.nodes[name] = Node(name, func, inputs, sources, persist, **params)
+        self._keys.clear()
+        return self
+
+    def set_params(self, name: str, **params) -> "Pipeline":
+        """
+        Updates the parameters of a node. The node and all of its descendants will
+        be recomputed on the next run.
+        """
+        self.nodes[name].params.update(params)
+        self._keys.clear()
+        return self
+
+    def key(self, name: str) -> str:
+        """
+        Returns the content address of the output of a node.
+        """
+        if name not in self._keys:
+            node = self.nodes[name]
+            self._keys[name] = cache.cache_key(
+                node.sources,
+                code=source_hash(node.func),
+                inputs=[self.key(i) for i in node.inputs],
+                **node.params,
+            )
+        return self._keys[name]
+
+    def path(self, name: str) -> str:
+        """
+        Returns the path of the Parquet file storing the output of a persisted node,
+        e.g. to share it with other processes after a run.
+        """
+        return cache.entry_path(name, self.key(name))
+
+    def run(self, *targets: str) -> Dict[str, pd.DataFrame]:
+        """
+        Computes the given nodes (all nodes by default) and returns their outputs.
+        Inputs of nodes found in the cache are not loaded nor computed.
+        """
+        self.timings = []
+        results: Dict[str, pd.DataFrame] = {}
+
+        def get(name: str) -> pd.DataFrame:
+            if name in results:
+                return results[name]
+            node = self.nodes[name]
+            key = self.key(name)
+            start = time.perf_counter()
+            df = cache.read(name, key) if node.persist else None
+            status = "cached"
+            if df is None:
+                inputs = [get(i) for i in node.inputs]
+                start = time.perf_counter()
+                df = node.func(*inputs, **node.params)
+                if node.persist:
+                    cache.write(name, key, df)
+                status = "computed" if node.persist else "loaded"
+            self._record(name, status, time.perf_counter() - start, df)
+            results[name] = df
+            return df
+
+        for name in targets or self.nodes:
+            get(name)
+        return {name: results[name] for name in targets or self.nodes}
+
+    def _record(self, name: str, status: str, seconds: float, df: pd.DataFrame):
+        self.timings.append(
+            {"node": name, "status": status, "seconds": seconds, "rows": len(df)}
+        )
+        if self.verbose:
+            print(f"{name:>15}: {status:>8} in {seconds:6.2f}s ({len(df):,} rows)")
+            memory = df.attrs.get("memory_mb")
+            if status == "computed" and memory:
+                # Set by clean.compact_dtypes
+                print(
+                    f"{'':>15}  compacted from {memory['before']:,.1f} MB to "
+                    f"{memory['after']:,.1f} MB ({memory['before'] / max(memory['after'], 1e-9):.1f}x)"
+                )
+
+    def report(self) -> pd.DataFrame:
+        """
+        Returns the timings of the nodes of the last run, in execution order.
+        """
+        return pd.DataFrame(self.timings, columns=["node", "status", "seconds", "rows"])
+
+
+def unique_movies(movies: pd.DataFrame, countries: Sequence[str]) -> pd.DataFrame:
+    """
+    Keeps the movies that originate from a single country of the given list.
+    """
+    return clean.unique_movies_and_countries(movies, countries)[0]
+
+
+def dated(
+    df: pd.DataFrame, min_year: int, max_year: int, compact: bool = False
+) -> pd.DataFrame:
+    """
+    Parses the movie release dates, keeps the given year interval and adds
+    the year and decade columns.
+    In compact mode, the rows are filtered without intermediate copies and the
+    columns use the compact types of clean.compact_dtypes.
+    """
+    if compact:
+        return clean.compact_dtypes(clean.filter_dated(df, min_year, max_year))
+    df = clean.parse_dates(df.copy(), "Movie_Release_Date")
+    df = clean.keep_dates(df, min_year, max_year)
+    clean.add_year_and_decade(df)
+    return df
+
+
+def summaries_d2(
+    summaries: pd.DataFrame, movies: pd.DataFrame, compact: bool = False
+) -> pd.DataFrame:
+    """
+    Aligns the plot summaries with the year, decade and country of their movie.
+    """
+    # The movies of D1 have a single country
+    summaries = join.MovieDimension(movies).align(
+        summaries, ["year", "decade", "Movie_Countries"]
+    )
+    return clean.compact_dtypes(summaries) if compact else summaries
+
+
+def characters_d3(
+    characters: pd.DataFrame,
+    movies: pd.DataFrame,
+    min_year: int,
+    max_year: int,
+    compact: bool = False,
+) -> pd.DataFrame:
+    """
+    Drops undefined actors and aligns the characters with the country of their movie,
+    keeping the given year interval.
+    """
+    if compact:
+        characters = clean.filter_dated(characters, min_year, max_year, defined_actors=True)
+        return clean.compact_dtypes(clean.align_movie_countries(characters, movies))
+    characters = clean.drop_undefined_actors(characters)
+    characters = clean.align_movie_countries(characters, movies)
+    return dated(characters, min_year, max_year)
+
+
+def datasets(
+    countries: Sequence[str] = COUNTRIES,
+    min_year: int = MIN_YEAR,
+    max_year: int = MAX_YEAR,
+    verbose: bool = True,
+    compact: bool = False,
+) -> Pipeline:
+    """
+    Returns the pipeline building the D1 (movies), D2 (plot summaries) and
+    D3 (characters) datasets.
+    In compact mode, the datasets store strings as categories (or Arrow strings) and
+    use small integer and float types, see clean.compact_dtypes. With verbose set,
+    the memory of each compacted dataset before and after is printed.
+    """
+    return (
+        Pipeline(verbose)
+        .add("movies_raw", load.movie_metadata, sources=[load.MOVIE_META_FILE], persist=False)
+        .add("summaries_raw", load.plot_summaries, sources=[load.PLOT_SUM])
+        .add(
+            "characters_raw",
+            load.character_metadata,
+            sources=[load.CHARACTER_META_FILE],
+            persist=False,
+        )
+        .add("movies_countries", unique_movies, ["movies_raw"], countries=list(countries))
+        .add(
+            "D1",
+            dated,
+            ["movies_countries"],
+            min_year=min_year,
+            max_year=max_year,
+            compact=compact,
+        )
+        .add("D2", summaries_d2, ["summaries_raw", "D1"], compact=compact)
+        .add(
+            "D3",
+            characters_d3,
+            ["characters_raw", "D1"],
+            min_year=min_year,
+            max_year=max_year,
+            compact=compact,
+        )
+    )
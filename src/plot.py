@@ -2,7 +2,15 @@ import seaborn as sns
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from typing import Tuple
+from typing import List, Optional, Sequence, Tuple
+if __package__:
+    from . import features, load
+else:
+    import features
+    import load
+
+# Titles of the countries in the plots
+TITLES = {"United States of America": "United States"}
 
 
 def movie_distribution_over_time(df: pd.DataFrame):
@@ -77,39 +85,35 @@ def runtime_comparison(runtimes: pd.DataFrame):
     plt.show()
 
 
-def ethnic_ratio_countries(df: pd.DataFrame):
+def country_axes(countries: Sequence[str]) -> List[plt.Axes]:
+    """
+    Creates one subplot per country, three per row, with the last row centered.
+    """
+    rows = int(np.ceil(len(countries) / 3))
+    axes = []
+    for row in range(rows):
+        n = min(3, len(countries) - 3 * row)
+        offset = 3 - n
+        for i in range(n):
+            axes.append(plt.subplot2grid((rows, 6), (row, offset + 2 * i), colspan=2))
+    return axes
+
+
+def ethnic_ratio_countries(df: pd.DataFrame, countries: Optional[Sequence[str]] = None):
     """
-    Creates 5 figures comparing the distribution of the top 5 ethnic groups for each country.
-    The distributions are visualized as barplots.
+    Creates one figure per country (by default the countries of load.COUNTRIES) comparing
+    the distribution of the top 5 ethnic groups. The distributions are visualized as barplots.
     """
+    countries = load.COUNTRIES if countries is None else countries
     data_max = df.max().Fraction
 
-    ax1 = plt.subplot2grid(shape=(2, 6), loc=(0, 0), colspan=2)
-    ax2 = plt.subplot2grid((2, 6), (0, 2), colspan=2)
-    ax3 = plt.subplot2grid((2, 6), (0, 4), colspan=2)
-    ax4 = plt.subplot2grid((2, 6), (1, 1), colspan=2)
-    ax5 = plt.subplot2grid((2, 6), (1, 3), colspan=2)
-
-    ax1.set_ylim([0 - data_max / 10, data_max + data_max / 10])
-    ax2.set_ylim([0 - data_max / 10, data_max + data_max / 10])
-    ax3.set_ylim([0 - data_max / 10, data_max + data_max / 10])
-    ax4.set_ylim([0 - data_max / 10, data_max + data_max / 10])
-    ax5.set_ylim([0 - data_max / 10, data_max + data_max / 10])
-
-    df.loc['France'].plot(kind='bar', title='France', ax=ax1)
-    df.loc['India'].plot(kind='bar', title='India', ax=ax2)
-    df.loc['Japan'].plot(kind='bar', title='Japan', ax=ax3)
-    df.loc['United Kingdom'].plot(kind='bar', title='United Kingdom', ax=ax4)
-    df.loc['United States of America'].plot(kind='bar', title='United States', ax=ax5)
-
-    ax1.legend().remove()
-    ax2.legend().remove()
-    ax3.legend().remove()
-    ax4.legend().remove()
-    ax5.legend().remove()
+    for country, ax in zip(countries, country_axes(countries)):
+        ax.set_ylim([0 - data_max / 10, data_max + data_max / 10])
+        df.loc[country].plot(kind='bar', title=TITLES.get(country, country), ax=ax)
+        ax.legend().remove()
 
     plt.subplots_adjust(hspace=2, wspace=15)
-    plt.suptitle("Distribution of Top 5 Ethnic Groups in the Big 5 Movie Industries")
+    plt.suptitle(f"Distribution of Top 5 Ethnic Groups in the Big {len(countries)} Movie Industries")
     plt.show()
 
 
@@ -127,23 +131,16 @@ def height_decades(dfs: Tuple[pd.DataFrame, pd.DataFrame], gender: str):
     plt.show()
 
 
-def distributions_countries(df: pd.DataFrame, feature, title, logy=False):
+def distributions_countries(df: pd.DataFrame, feature, title, logy=False,
+                            countries: Optional[Sequence[str]] = None):
     """
-    Creates 5 figures comparing the distribution for each country.
+    Creates one figure per country comparing the distribution, by default for the countries
+    of load.COUNTRIES (e.g. pass the countries of the data to plot all of them).
     """
+    split = features.group_split(df, 'Movie_Countries', feature, countries or load.COUNTRIES)
 
-    ax1 = plt.subplot2grid(shape=(2, 6), loc=(0, 0), colspan=2)
-    ax2 = plt.subplot2grid((2, 6), (0, 2), colspan=2)
-    ax3 = plt.subplot2grid((2, 6), (0, 4), colspan=2)
-    ax4 = plt.subplot2grid((2, 6), (1, 1), colspan=2)
-    ax5 = plt.subplot2grid((2, 6), (1, 3), colspan=2)
-
-    df[df.Movie_Countries == 'France'][feature].plot(kind='hist', title='France', ax=ax1, logy=logy)
-    df[df.Movie_Countries == 'India'][feature].plot(kind='hist', title='India', ax=ax2, logy=logy)
-    df[df.Movie_Countries == 'Japan'][feature].plot(kind='hist', title='Japan', ax=ax3, logy=logy)
-    df[df.Movie_Countries == 'United Kingdom'][feature].plot(kind='hist', title='United Kingdom', ax=ax4, logy=logy)
-    df[df.Movie_Countries == 'United States of America'][feature].plot(kind='hist', title='United States', ax=ax5,
-                                                                       logy=logy)
+    for (country, values), ax in zip(split.items(), country_axes(list(split))):
+        values.plot(kind='hist', title=TITLES.get(country, country), ax=ax, logy=logy)
 
     plt.subplots_adjust(hspace=2, wspace=15)
     plt.suptitle(title)
@@ -184,37 +181,24 @@ def countries_decades(countries: pd.Series, decades: pd.Series, name):
     plt.tight_layout()
 
 
-def diversity(div_fr: pd.DataFrame, div_in: pd.DataFrame, div_jp: pd.DataFrame,
-              div_uk: pd.DataFrame, div_us: pd.DataFrame):
+def diversity(*diversities: pd.Series, countries: Optional[Sequence[str]] = None):
     """
-    Plot the diversity development of the different countries.
+    Plot the diversity development of the different countries, either from one series per
+    country indexed by decade, in the order of countries (by default the five industries),
+    or from a single series indexed by country and decade.
     """
-    data_max = pd.concat([div_fr, div_in, div_jp, div_uk, div_us], axis=0).max()
-
-    ax1 = plt.subplot2grid(shape=(2, 6), loc=(0, 0), colspan=2)
-    ax2 = plt.subplot2grid((2, 6), (0, 2), colspan=2)
-    ax3 = plt.subplot2grid((2, 6), (0, 4), colspan=2)
-    ax4 = plt.subplot2grid((2, 6), (1, 1), colspan=2)
-    ax5 = plt.subplot2grid((2, 6), (1, 3), colspan=2)
-
-    ax1.set_ylim([0 - data_max / 10, data_max + data_max / 10])
-    ax2.set_ylim([0 - data_max / 10, data_max + data_max / 10])
-    ax3.set_ylim([0 - data_max / 10, data_max + data_max / 10])
-    ax4.set_ylim([0 - data_max / 10, data_max + data_max / 10])
-    ax5.set_ylim([0 - data_max / 10, data_max + data_max / 10])
-
-    ax1.axhline(5, color='r', linestyle='--')
-    ax2.axhline(5, color='r', linestyle='--')
-    ax3.axhline(5, color='r', linestyle='--')
-    ax4.axhline(5, color='r', linestyle='--')
-    ax5.axhline(5, color='r', linestyle='--')
+    if len(diversities) == 1 and 'Movie_Countries' in diversities[0].index.names:
+        split = {country: values.droplevel('Movie_Countries')
+                 for country, values in diversities[0].groupby(level='Movie_Countries')}
+    else:
+        split = dict(zip(countries or load.COUNTRIES, diversities))
+    data_max = pd.concat(list(split.values()), axis=0).max()
 
-    div_fr.plot(kind='bar', title='France', ax=ax1)
-    div_in.plot(kind='bar', title='India', ax=ax2)
-    div_jp.plot(kind='bar', title='Japan', ax=ax3)
-    div_uk.plot(kind='bar', title='United Kingdom', ax=ax4)
-    div_us.plot(kind='bar', title='United States', ax=ax5)
+    for (country, values), ax in zip(split.items(), country_axes(list(split))):
+        ax.set_ylim([0 - data_max / 10, data_max + data_max / 10])
+        ax.axhline(5, color='r', linestyle='--')
+        values.plot(kind='bar', title=TITLES.get(country, country), ax=ax)
 
     plt.subplots_adjust(hspace=2, wspace=15)
-    plt.suptitle("Diversity in the Big 5 Movie Industries")
+    plt.suptitle(f"Diversity in the Big {len(split)} Movie Industries")
     plt.show()
@@ -0,0 +1,115 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Sequence, Tuple
+
+# Wikidata query results mapping the Freebase IDs of the ethnicities to their labels
+QUERY_FILE = "../data/query.json"
+# Offline mapping of the Freebase IDs of the languages, countries and genres of the movies
+MAPPING_FILE = "../data/freebase_labels.parquet"
+
+# Resolvers already loaded, by file path and modification time
+_RESOLVERS: Dict[Tuple[str, float], "Resolver"] = {}
+
+
+class Resolver:
+    """
+    Maps Freebase IDs to their labels. The mapping is an index of the IDs, such that
+    a column is resolved by looking up each distinct value once and gathering the
+    labels of the rows with array indexing, instead of a replace over all rows.
+    """
+
+    def __init__(self, ids: Sequence[str], labels: Sequence[str]):
+        mapping = pd.DataFrame({"id": ids, "label": labels}).drop_duplicates("id")
+        self.ids = pd.Index(mapping.id)
+        self.labels = mapping.label.to_numpy(dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def from_records(
+        records: List[Dict], id_key: str = "freebaseID", label_key: str = "itemLabel"
+    ) -> "Resolver":
+        """
+        Builds the mapping from records of an ID and a label, as in the Wikidata query results.
+        """
+        mapping = pd.DataFrame.from_records(records, columns=[id_key, label_key])
+        return Resolver(mapping[id_key], mapping[label_key])
+
+    @staticmethod
+    def load(path: str = QUERY_FILE) -> "Resolver":
+        """
+        Loads the mapping from a JSON file of Wikidata query results, or from a Parquet
+        file written by save_mapping. The mapping is only read again if the file changed.
+        """
+        key = (os.path.abspath(path), os.path.getmtime(path))
+        if key not in _RESOLVERS:
+            if path.endswith(".parquet"):
+                mapping = pd.read_parquet(path, columns=["freebase_id", "label"])
+                resolver = Resolver(mapping.freebase_id, mapping.label)
+            else:
+                with open(path) as f:
+                    resolver = Resolver.from_records(json.load(f))
+            _RESOLVERS[key] = resolver
+        return _RESOLVERS[key]
+
+    def resolve(self, values: pd.Series) -> Tuple[pd.Series, pd.Index]:
+        """
+        Replaces the Freebase IDs of the given column by their labels. IDs without label
+        are kept as is. Returns the categorical resolved column and the unresolved IDs.
+        """
+        codes, uniques = pd.factorize(values)
+        positions = self.ids.get_indexer(uniques)
+        found = positions >= 0
+        resolved = np.asarray(uniques, dtype=object).copy()
+        resolved[found] = self.labels[positions[found]]
+        # Several IDs can have the same label
+        label_codes, categories = pd.factorize(resolved)
+        row_codes = np.where(codes >= 0, label_codes[codes], -1)
+        column = pd.Series(
+            pd.Categorical.from_codes(row_codes, categories),
+            index=values.index,
+            name=values.name,
+        )
+        return column, pd.Index(uniques[~found])
+
+
+def freebase_labels(
+    df: pd.DataFrame,
+    columns: Sequence[str] = ("Movie_Languages", "Movie_Countries", "Movie_Genres"),
+) -> pd.DataFrame:
+    """
+    Extracts the mapping of Freebase IDs to labels from the {freebase_id:value} columns
+    of the raw movie metadata, with the column of each ID. Each distinct string is only
+    parsed once.
+    """
+    mappings = []
+    for column in columns:
+        ids, labels = [], []
+        for value in df[column].dropna().unique():
+            parsed = json.loads(value)
+            ids.extend(parsed.keys())
+            labels.extend(parsed.values())
+        mappings.append(pd.DataFrame({"freebase_id": ids, "label": labels, "column": column}))
+    return pd.concat(mappings, ignore_index=True).drop_duplicates("freebase_id")
+
+
+def save_mapping(mapping: pd.DataFrame, path: str = MAPPING_FILE):
+    """
+    Saves a mapping returned by freebase_labels, to resolve IDs offline with Resolver.load.
+    """
+    mapping.to_parquet(path, index=False)
+
+
+def resolve_column(
+    df: pd.DataFrame, column: str, path: str = QUERY_FILE, verbose: bool = False
+) -> pd.DataFrame:
+    """
+    Returns the dataframe with the Freebase IDs of the given column replaced by their labels.
+    """
+    resolved, unresolved = Resolver.load(path).resolve(df[column])
+    if verbose and len(unresolved):
+        print(f"WARNING: {len(unresolved):,} {column} IDs without label")
+    return df.assign(**{column: resolved})
@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+def contingency_counts(df: pd.DataFrame, index: str, columns: str) -> pd.DataFrame:
+    """
+    Counts the rows of each pair of values of two columns in a single groupby, e.g.
+    the characters of each country and gender. Tables of several chunks of the data
+    are combined with DataFrame.add(..., fill_value=0).
+    """
+    counts = df.groupby([index, columns], observed=True).size()
+    return counts.unstack(columns, fill_value=0)
+
+
+def chi2_test(
+    observed: np.ndarray, correction: bool = True
+) -> Tuple[float, float, int, np.ndarray]:
+    """
+    Chi-squared test of independence of the rows and columns of a contingency table.
+    Returns the statistic, p-value, degrees of freedom and expected counts, as
+    scipy.stats.chi2_contingency, including its Yates correction for 2 x 2 tables.
+    """
+    from scipy.stats import chi2
+
+    observed = np.asarray(observed, dtype=np.float64)
+    expected = observed.sum(axis=1, keepdims=True) * observed.sum(axis=0) / observed.sum()
+    dof = (observed.shape[0] - 1) * (observed.shape[1] - 1)
+    difference = np.abs(observed - expected)
+    if correction and dof == 1:
+        difference = np.maximum(difference - 0.5, 0)
+    statistic = float(np.sum(difference**2 / expected))
+    return statistic, float(chi2.sf(statistic, dof)), dof, expected
+
+
+class OLSResult:
+    """
+    Coefficients of a linear regression, with the attributes of a statsmodels result
+    used by plot.reg_coeff (params and conf_int).
+    """
+
+    def __init__(self, params: pd.Series, cov: pd.DataFrame, df_resid: int, rsquared: float):
+        self.params = params
+        self.cov_params = cov
+        self.df_resid = df_resid
+        self.rsquared = rsquared
+        self.bse = pd.Series(np.sqrt(np.diag(cov)), index=params.index)
+
+    def conf_int(self, alpha: float = 0.05) -> pd.DataFrame:
+        """
+        Returns the lower (column 0) and upper (column 1) bounds of the confidence
+        interval of each coefficient.
+        """
+        from scipy.stats import t
+
+        q = t.ppf(1 - alpha / 2, self.df_resid)
+        return pd.DataFrame({0: self.params - q * self.bse, 1: self.params + q * self.bse})
+
+    @property
+    def pvalues(self) -> pd.Series:
+        """
+        Returns the p-value of the t-test of each coefficient being zero.
+        """
+        from scipy.stats import t
+
+        return pd.Series(2 * t.sf(np.abs(self.params / self.bse), self.df_resid), index=self.params.index)
+
+
+class OLSStatistics:
+    """
+    Sufficient statistics of a linear regression of a response on numeric and
+    categorical predictors: the cross-products X'X, X'y and y'y and the number of
+    observations. They are accumulated from chunks of rows or from grouped tables,
+    merged by addition, and fitted without the row-level data.
+    The design has an intercept, one indicator per level of each categorical predictor
+    but the first, and the numeric predictors, named as in a statsmodels formula
+    (e.g. "response ~ C(countries) + decade").
+    """
+
+    def __init__(
+        self,
+        response: str,
+        numeric: Sequence[str] = (),
+        levels: Optional[Dict[str, Sequence]] = None,
+    ):
+        self.response = response
+        self.numeric = list(numeric)
+        self.levels = {column: pd.Index(values) for column, values in (levels or {}).items()}
+        self.names = ["Intercept"]
+        for column, values in self.levels.items():
+            self.names += [f"C({column})[T.{value}]" for value in values[1:]]
+        self.names += self.numeric
+        k = len(self.names)
+        self.xtx = np.zeros((k, k))
+        self.xty = np.zeros(k)
+        self.yty = 0.0
+        self.n = 0
+
+    def design(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Returns the design matrix of the given rows. Unknown levels raise a KeyError.
+        """
+        columns = [np.ones(len(df))]
+        for column, values in self.levels.items():
+            codes = values.get_indexer(df[column])
+            if (codes < 0).any():
+                raise KeyError(f"Unknown levels of {column}: {list(df[column][codes < 0].unique())}")
+            columns += [codes == i for i in range(1, len(values))]
+        columns += [df[column].to_numpy(dtype=np.float64) for column in self.numeric]
+        return np.column_stack(columns).astype(np.float64)
+
+    def update(self, df: pd.DataFrame) -> "OLSStatistics":
+        """
+        Adds the rows of the given DataFrame. Rows with a missing response or predictor
+        are skipped.
+        """
+        df = df[df[[self.response, *self.numeric, *self.levels]].notna().all(axis=1)]
+        x = self.design(df)
+        y = df[self.response].to_numpy(dtype=np.float64)
+        self.xtx += x.T @ x
+        self.xty += x.T @ y
+        self.yty += y @ y
+        self.n += len(y)
+        return self
+
+    def update_groups(
+        self, df: pd.DataFrame, count: str = "count", total: str = "sum", squares: str = "sum_sq"
+    ) -> "OLSStatistics":
+        """
+        Adds the rows summarized by a grouped table, with the predictors, the number of
+        rows, the sum of the response and the sum of its squares for each group. The
+        predictors must be constant within each group (e.g. groups by country and decade).
+        """
+        x = self.design(df)
+        counts = df[count].to_numpy(dtype=np.float64)
+        self.xtx += x.T @ (x * counts[:, None])
+        self.xty += x.T @ df[total].to_numpy(dtype=np.float64)
+        self.yty += df[squares].sum()
+        self.n += int(counts.sum())
+        return self
+
+    def merge(self, other: "OLSStatistics") -> "OLSStatistics":
+        """
+        Adds the statistics of the same regression over other rows, e.g. of new movies.
+        """
+        if self.names != other.names or self.response != other.response:
+            raise ValueError("Cannot merge the statistics of different regressions")
+        self.xtx += other.xtx
+        self.xty += other.xty
+        self.yty += other.yty
+        self.n += other.n
+        return self
+
+    def fit(self) -> OLSResult:
+        """
+        Computes the least squares coefficients and their covariance. Raises a ValueError
+        if there are no residual degrees of freedom (e.g. a saturated model, with one
+        decade per country), as the standard errors are then undefined.
+        """
+        rank = np.linalg.matrix_rank(self.xtx)
+        df_resid = self.n - rank
+        if df_resid <= 0:
+            raise ValueError(
+                f"No residual degrees of freedom: {self.n} observations for {rank} "
+                f"independent predictors of {self.response}"
+            )
+        inverse = np.linalg.pinv(self.xtx)
+        params = inverse @ self.xty
+        rss = max(self.yty - params @ self.xty, 0.0)
+        tss = self.yty - self.xty[0] ** 2 / self.n
+        cov = inverse * rss / df_resid
+        return OLSResult(
+            pd.Series(params, index=self.names),
+            pd.DataFrame(cov, index=self.names, columns=self.names),
+            df_resid,
+            1 - rss / tss,
+        )
+
+
+def ols(
+    df: pd.DataFrame,
+    response: str,
+    numeric: Sequence[str] = ("decade",),
+    categorical: Sequence[str] = ("countries",),
+) -> OLSResult:
+    """
+    Fits a linear regression of the response on the given predictors of a DataFrame,
+    e.g. of load.std_full or load.diversity_full. The levels of the categorical
+    predictors are sorted, and the first one is the reference.
+    """
+    levels = {column: sorted(df[column].dropna().unique()) for column in categorical}
+    return OLSStatistics(response, numeric, levels).update(df).fit()
+
+
+def group_sums(df: pd.DataFrame, by: List[str], response: str) -> pd.DataFrame:
+    """
+    Summarizes the response by group into the table of OLSStatistics.update_groups,
+    e.g. the ages of the characters by country and decade.
+    """
+    values = df[by].assign(
+        count=df[response].notna().astype(np.int64),
+        sum=df[response].fillna(0),
+        sum_sq=df[response].fillna(0) ** 2,
+    )
+    return values.groupby(by, observed=True, as_index=False).sum()
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+from src import clean
+
+QUERY_RESULTS = [
+    {"freebaseID": "/m/041rx", "itemLabel": "Jewish people"},
+    {"freebaseID": "/m/0dryh9k", "itemLabel": "Indian people"},
+    {"freebaseID": "/m/0x67", "itemLabel": "African Americans"},
+]
+
+
+def characters() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "Freebase_Actor_ID": ["/m/01", "/m/02", "/m/03", "/m/04", "/m/05"],
+            "Actor_Ethnicity": pd.Series(
+                ["/m/041rx", np.nan, "/m/0x67", "/m/unknown", "/m/041rx"], dtype=object
+            ),
+        }
+    )
+
+
+def test_get_ethnicities_output_unchanged():
+    df = characters()
+    # Previous implementation: a replace with the mapping of the query results
+    mapping = {item["freebaseID"]: item["itemLabel"] for item in QUERY_RESULTS}
+    expected = df.replace({"Actor_Ethnicity": mapping})
+    result = clean.get_ethnicities(df, QUERY_RESULTS)
+    assert result.Actor_Ethnicity.dtype == object
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_get_ethnicities_categorical():
+    result = clean.get_ethnicities(characters(), QUERY_RESULTS, categorical=True)
+    assert isinstance(result.Actor_Ethnicity.dtype, pd.CategoricalDtype)
+    assert list(result.Actor_Ethnicity.astype(object).fillna("")) == [
+        "Jewish people",
+        "",
+        "African Americans",
+        "/m/unknown",
+        "Jewish people",
+    ]
+
+
+def exploded_movies() -> pd.DataFrame:
+    # One row per language and genre of each movie, as load.movie_metadata
+    return pd.DataFrame(
+        {
+            "Wikipedia_Movie_ID": [2, 1, 2, 3, 1, 2, 5],
+            "Movie_Name": ["B", "A", "B", "C", "A", "B", "E"],
+            "Movie_Countries": ["France", "India", "France", "India", "India", "France", "Japan"],
+            "Movie_Genres": ["Drama", "Action", "Drama", "Comedy", "Drama", "Comedy", "Drama"],
+            "Movie_Release_Date": ["1990/01/01", "1985/02/02", "1990/01/01", "2000/03/03", "1985/02/02", "1990/01/01", "1970/04/04"],
+            "year": [1990, 1985, 1990, 2000, 1985, 1990, 1970],
+            "decade": [1990, 1980, 1990, 2000, 1980, 1990, 1970],
+        }
+    )
+
+
+def test_alignments_match_merge():
+    movies = exploded_movies()
+    summaries = pd.DataFrame({"Wikipedia_Movie_ID": [1, 4, 2, 3], "Summary": ["a", "d", "b", "c"]})
+    characters = pd.DataFrame(
+        {
+            "Wikipedia_Movie_ID": [3, 2, 1, 2, 4],
+            "Freebase_Actor_ID": ["/m/01", "/m/02", "/m/03", "/m/04", "/m/05"],
+            "Movie_Release_Date": ["2000/03/03", "1991/01/01", "1985/02/02", "1990/01/01", "1999/01/01"],
+        }
+    )
+    # Previous implementations
+    pd.testing.assert_frame_equal(
+        clean.align_year_and_decade(summaries, movies),
+        summaries.merge(movies[["Wikipedia_Movie_ID", "year", "decade"]], on="Wikipedia_Movie_ID"),
+    )
+    pd.testing.assert_frame_equal(
+        clean.align_genres_and_name(summaries, movies),
+        summaries.merge(
+            movies[["Wikipedia_Movie_ID", "Movie_Genres", "Movie_Name"]], on="Wikipedia_Movie_ID"
+        ),
+    )
+    pd.testing.assert_frame_equal(
+        clean.align_movie_countries(characters, movies),
+        movies[["Wikipedia_Movie_ID", "Movie_Countries"]]
+        .drop_duplicates()
+        .merge(characters, on="Wikipedia_Movie_ID"),
+    )
+    merged = pd.merge(
+        movies[["Wikipedia_Movie_ID", "Movie_Release_Date"]],
+        characters[["Wikipedia_Movie_ID", "Movie_Release_Date"]],
+        on="Wikipedia_Movie_ID",
+    )
+    assert clean.date_differences(movies, characters) == 3
+    assert (
+        clean.date_differences(movies, characters)
+        == (merged.Movie_Release_Date_x != merged.Movie_Release_Date_y).sum()
+    )
+
+
+def test_year_difference_coerces_invalid_dates():
+    later = pd.Series(["1990/03/01", "junk", "1990/03/01"])
+    earlier = pd.Series(["1960/06/01", "1960/06/01", None])
+    result = clean.year_difference(later, earlier)
+    assert result[0] == 30 and result[1:].isna().all()
+
+
+def test_complete_dates():
+    dates = pd.Series(["1985-06-03", "1985/06/03", "1985", "1985-06", None])
+    assert clean.complete_dates(dates).tolist() == [True, True, False, False, False]
+    assert clean.complete_dates(pd.Series(pd.to_datetime(["1985-06-03", "1985-01-01"]))).all()
@@ -0,0 +1,60 @@
+import numpy as np
+
+from src.embeddings import DIGEST_SIZE, EmbeddingStore
+
+
+class WordModel:
+    """
+    Deterministic stand-in for a sentence transformer.
+    """
+
+    def encode(self, sentences, **kwargs):
+        return np.array(
+            [[len(s), sum(map(ord, s)) % 97, s.count(" ")] for s in sentences], dtype=np.float32
+        )
+
+
+def test_encode_persists_embeddings(tmp_path):
+    model = WordModel()
+    sentences = ["a cat", "a dog", "a cat"]
+    store = EmbeddingStore(model, "model", str(tmp_path))
+    np.testing.assert_array_equal(store.encode(sentences), model.encode(sentences))
+    reopened = EmbeddingStore(model, "model", str(tmp_path))
+    assert len(reopened) == 2
+    np.testing.assert_array_equal(reopened.encode(sentences), model.encode(sentences))
+
+
+def test_recovery_after_interrupted_write(tmp_path):
+    model = WordModel()
+    store = EmbeddingStore(model, "model", str(tmp_path))
+    store.encode(["first sentence", "second sentence"])
+    # Interrupted write: an extra index entry, and an incomplete extra embedding
+    with open(store.index_path, "ab") as f:
+        f.write(b"x" * DIGEST_SIZE)
+    with open(store.matrix_path, "ab") as f:
+        f.write(b"\0" * 5)
+
+    recovered = EmbeddingStore(model, "model", str(tmp_path))
+    assert len(recovered) == 2
+    new = ["third sentence", "fourth sentence"]
+    np.testing.assert_array_equal(recovered.encode(new), model.encode(new))
+
+    reopened = EmbeddingStore(model, "model", str(tmp_path))
+    sentences = ["first sentence", "second sentence"] + new
+    assert len(reopened) == 4
+    np.testing.assert_array_equal(reopened.encode(sentences), model.encode(sentences))
+
+
+def test_recovery_after_interrupted_first_write(tmp_path):
+    model = WordModel()
+    store = EmbeddingStore(model, "model", str(tmp_path))
+    store.encode(["first sentence"])
+    # Only the embeddings were written
+    open(store.index_path, "wb").close()
+
+    recovered = EmbeddingStore(model, "model", str(tmp_path))
+    assert len(recovered) == 0
+    sentences = ["second sentence", "first sentence"]
+    np.testing.assert_array_equal(recovered.encode(sentences), model.encode(sentences))
+    reopened = EmbeddingStore(model, "model", str(tmp_path))
+    np.testing.assert_array_equal(reopened.encode(sentences), model.encode(sentences))
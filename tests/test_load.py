@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+from src import load
+
+SHORT = ["France"] * 7 + ["India"] * 7 + ["Japan"] * 7 + ["UK"] * 7 + ["US"] * 7
+
+
+def test_std_full_forms():
+    values = np.arange(35.0)
+    # Previous implementation, from the 35 values in order
+    expected = pd.DataFrame({"std": values, "decade": load.DECADES * 5, "countries": SHORT})
+    index = pd.MultiIndex.from_product(
+        [load.COUNTRIES, load.DECADES], names=["Movie_Countries", "decade"]
+    )
+    for df in [
+        pd.DataFrame({"Actor_Age": values}),
+        pd.Series(values),
+        pd.Series(values, index=index),
+        pd.Series(values[::-1], index=index[::-1]),
+    ]:
+        pd.testing.assert_frame_equal(load.std_full(df), expected, check_dtype=False)
+
+
+def test_diversity_full_forms():
+    decades = pd.Index(load.DECADES, name="decade")
+    diversities = [pd.Series(np.arange(7.0) + i, index=decades) for i in range(5)]
+    expected = pd.DataFrame(
+        {"decade": load.DECADES * 5, "diversity": np.concatenate(diversities), "countries": SHORT}
+    )
+    combined = pd.concat(diversities, keys=load.COUNTRIES, names=["Movie_Countries", "decade"])
+    for result in [load.diversity_full(*diversities), load.diversity_full(combined)]:
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
@@ -0,0 +1,11 @@
+import pandas as pd
+import pytest
+
+from src import stats
+
+
+def test_fit_without_residual_degrees_of_freedom():
+    # One observation per country: the model is saturated
+    df = pd.DataFrame({"countries": ["France", "India", "Japan"], "decade": [1990, 2000, 1990], "std": [1.0, 2.0, 3.0]})
+    with pytest.raises(ValueError, match="degrees of freedom"):
+        stats.ols(df, "std")